@@ -1,22 +1,36 @@
-from llm import llm
-
-
-def generate_followup_questions(symptom_text):
-    """
-    Generate intelligent follow-up questions
-    to improve medical differentiation.
-    """
+from typing import List, Optional
+
+from admission import with_deadline
+from llm import get_llm, run_sync
+from metrics import record_tokens, timed
+from tracing import traced
+from rag import RetrievalContext, differential_documents
+from question_cache import cache_questions, get_cached_questions
+
+# Sections that say how a condition differs from look-alikes
+DIFFERENTIAL_SECTIONS = ["key_differentiating_symptoms", "key_differentiating_features", "quick_differentiation"]
+MAX_DIFFERENTIAL_DOCS = 6
+
+
+def _build_prompt(symptom_text: str, differential: list) -> str:
+    grounding = ""
+    if differential:
+        context = "\n\n".join(doc.page_content for doc in differential)
+        grounding = f"""
+Candidate conditions (from the medical knowledge base):
+{context}
+"""
 
-    prompt = f"""
+    return f"""
 You are a cautious healthcare assistant.
 
 User symptoms:
 {symptom_text}
-
+{grounding}
 Generate EXACTLY 3 follow-up questions.
 
 Rules:
-- Questions must help differentiate illnesses
+- Questions must help differentiate illnesses{" (tell the candidate conditions apart)" if differential else ""}
 - Keep each question under 12 words
 - No diagnosis
 - No advice
@@ -26,32 +40,80 @@ Rules:
 Return ONLY the questions.
 """
 
+
+def _parse_questions(text: str) -> List[str]:
+    questions = []
+
+    for line in text.split("\n"):
+
+        line = line.strip()
+
+        # Remove numbering like 1. 2) -
+        line = line.lstrip("0123456789.-) ")
+
+        if "?" not in line:
+            continue
+
+        questions.append(line)
+
+    return questions
+
+
+async def aask_followup_questions(symptom_text: str, retrieval: Optional[RetrievalContext] = None) -> Optional[List[str]]:
+    """
+    One LLM round for follow-up questions; None when the call fails or
+    yields fewer than 3 questions.
+
+    With a retrieval for the symptoms, the questions are grounded in what
+    distinguishes the retrieved candidate conditions.
+    """
     try:
-        response = llm.invoke(prompt)
+        differential = differential_documents(retrieval, DIFFERENTIAL_SECTIONS) if retrieval else []
+        prompt = _build_prompt(symptom_text, differential[:MAX_DIFFERENTIAL_DOCS])
+
+        with timed("followup"):
+            response = await with_deadline(get_llm().ainvoke(prompt))
+        record_tokens("followup", response)
+        content = response.content if hasattr(response, "content") else str(response)
+        questions = _parse_questions(content)
+    except Exception:
+        return None
 
-        questions = []
+    return questions[:3] if len(questions) >= 3 else None
 
-        for line in response.split("\n"):
 
-            line = line.strip()
+@traced("followup_questions")
+async def agenerate_followup_questions(
+    symptom_text: str,
+    retrieval: Optional[RetrievalContext] = None,
+    check_cache: bool = True,
+) -> List[str]:
+    """
+    Generate intelligent follow-up questions
+    to improve medical differentiation.
 
-            # Remove numbering like 1. 2) -
-            line = line.lstrip("0123456789.-) ")
+    Questions are cached per symptom signature (see question_cache); pass
+    check_cache=False when the caller has already looked the text up.
+    """
 
-            if "?" not in line:
-                continue
+    if check_cache:
+        cached = get_cached_questions(symptom_text)
+        if cached is not None:
+            return cached
 
-            questions.append(line)
+    try:
+        questions = await aask_followup_questions(symptom_text, retrieval)
 
         # Safety fallback (VERY IMPORTANT)
-        if len(questions) < 3:
+        if questions is None:
             return [
                 "How long have you had these symptoms?",
                 "Are the symptoms worsening?",
                 "Do you have fever or pain?"
             ]
 
-        return questions[:3]
+        cache_questions(symptom_text, questions)
+        return questions
 
     except Exception:
 
@@ -61,3 +123,8 @@ Return ONLY the questions.
             "Are the symptoms getting worse?",
             "Have you noticed anything unusual (pain, fever, fatigue)?"
         ]
+
+
+def generate_followup_questions(symptom_text: str, retrieval: Optional[RetrievalContext] = None) -> List[str]:
+    """Synchronous wrapper around agenerate_followup_questions for the CLI and Streamlit app."""
+    return run_sync(agenerate_followup_questions(symptom_text, retrieval))
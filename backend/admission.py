@@ -0,0 +1,193 @@
+"""
+Admission control and request deadlines for LLM-bound work.
+
+At most ANALYSIS_MAX_CONCURRENCY analyses run at once; up to
+ANALYSIS_MAX_QUEUE more wait for a slot. Beyond that, requests are shed
+immediately with Overloaded (the server answers 503 + Retry-After)
+instead of piling up until every one of them hits the LLM timeout.
+
+Each admitted request gets a deadline ANALYSIS_DEADLINE_SECONDS after it
+arrived, queueing included. It is kept in a context variable, so LLM
+calls made on its behalf (even from tasks it spawns) can be bounded by
+the time left with with_deadline() / iterate_with_deadline().
+
+A request that only waits on work another request is already doing (a
+coalesced duplicate, see singleflight.py) lends its slot out meanwhile
+with wait_without_slot() and takes it back with reclaim_slot() only if
+it ends up computing after all.
+"""
+
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional
+
+from logger import get_logger
+from metrics import ADMISSION_WAIT_SECONDS
+from tracing import span
+
+logger = get_logger(__name__)
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+_admission: ContextVar[Optional["_Admission"]] = ContextVar("admission", default=None)
+
+
+class Overloaded(Exception):
+    """No capacity for the request within its deadline; retry after retry_after seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+async def with_deadline(awaitable: Awaitable[Any]) -> Any:
+    """Await, raising asyncio.TimeoutError once the request deadline passes."""
+    return await asyncio.wait_for(awaitable, timeout=remaining_time())
+
+
+async def iterate_with_deadline(iterable) -> AsyncIterator[Any]:
+    """Iterate an async stream, raising asyncio.TimeoutError once the request deadline passes."""
+    iterator = iterable.__aiter__()
+    while True:
+        try:
+            item = await asyncio.wait_for(iterator.__anext__(), timeout=remaining_time())
+        except StopAsyncIteration:
+            return
+        yield item
+
+
+class _Admission:
+    """The slot an admitted request holds, which it can hand back while it only waits."""
+    __slots__ = ("controller", "holds_slot")
+
+    def __init__(self, controller: "AdmissionController"):
+        self.controller = controller
+        self.holds_slot = True
+
+
+async def wait_without_slot(awaitable: Awaitable[Any]) -> Any:
+    """
+    Await work another request is doing, bounded by the request deadline.
+
+    The current request's slot is released first so the wait does not
+    take capacity; call reclaim_slot() before doing LLM-bound work again.
+    """
+    admission = _admission.get()
+    if admission is not None and admission.holds_slot:
+        admission.holds_slot = False
+        admission.controller._release()
+    return await with_deadline(awaitable)
+
+
+async def reclaim_slot():
+    """Take back a slot given up by wait_without_slot(), queueing within the deadline (may raise Overloaded)."""
+    admission = _admission.get()
+    if admission is not None and not admission.holds_slot:
+        await admission.controller._acquire(_deadline.get())
+        admission.holds_slot = True
+
+
+class AdmissionController:
+    """Concurrency limit plus a bounded wait queue, with queue-depth and wait-time stats."""
+
+    # Service time assumed for Retry-After until real requests have been timed
+    INITIAL_SERVICE_SECONDS = 5.0
+
+    def __init__(self, max_concurrency: int, max_queue: int, deadline_seconds: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.deadline_seconds = deadline_seconds
+        self._slots = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self.active = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.service_seconds_avg = self.INITIAL_SERVICE_SECONDS
+
+    def retry_after(self) -> int:
+        """Rough seconds until a queue slot frees up, for the Retry-After header."""
+        slots = max(self.max_concurrency, 1)
+        return max(1, math.ceil(self.service_seconds_avg * (self.queued + 1) / slots))
+
+    async def _acquire(self, deadline: Optional[float]):
+        """Wait for a slot until deadline; Overloaded when the queue is full or the deadline passes."""
+        if self._slots is not None:
+            # Own counters, not the semaphore: acquisitions in progress have not locked it yet
+            if self.active + self.queued >= self.max_concurrency + self.max_queue:
+                self.rejected += 1
+                logger.warning(f"🚦 Admission queue full ({self.active} running, {self.queued} waiting), shedding request")
+                raise Overloaded(self.retry_after())
+
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+            try:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                with span("admission_queue", queued=self.queued):
+                    await asyncio.wait_for(self._slots.acquire(), timeout=timeout)
+            except asyncio.TimeoutError:
+                self.expired += 1
+                logger.warning("🚦 Request deadline passed while queued, shedding request")
+                raise Overloaded(self.retry_after())
+            finally:
+                self.queued -= 1
+        self.active += 1
+
+    def _release(self):
+        self.active -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold an analysis slot for the duration of the block, under the request deadline."""
+        arrived = time.monotonic()
+        deadline = arrived + self.deadline_seconds if self.deadline_seconds > 0 else None
+        await self._acquire(deadline)
+
+        waited = time.monotonic() - arrived
+        self.admitted += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        ADMISSION_WAIT_SECONDS.observe(waited)
+        admission = _Admission(self)
+        token = _deadline.set(deadline)
+        admission_token = _admission.set(admission)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            _admission.reset(admission_token)
+            _deadline.reset(token)
+            if admission.holds_slot:
+                self._release()
+            # Moving average keeps Retry-After tracking current conditions
+            self.service_seconds_avg += 0.2 * ((time.monotonic() - started) - self.service_seconds_avg)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of capacity, queue depth and wait times."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "deadline_seconds": self.deadline_seconds,
+            "active": self.active,
+            "queued": self.queued,
+            "peak_queued": self.peak_queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "expired_in_queue": self.expired,
+            "avg_wait_ms": round(self.wait_seconds_total / self.admitted * 1000, 1) if self.admitted else 0.0,
+            "max_wait_ms": round(self.wait_seconds_max * 1000, 1),
+            "avg_service_ms": round(self.service_seconds_avg * 1000, 1),
+        }
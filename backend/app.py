@@ -1,6 +1,8 @@
 import streamlit as st
 from adaptive_questions import generate_followup_questions
 from chatbot import analyze
+from llm import run_sync
+from rag import aretrieve
 
 
 # -------------------------------------------------
@@ -107,6 +109,7 @@ if "messages" not in st.session_state:
     st.session_state.answers = []
     st.session_state.q_index = 0
     st.session_state.analysis_done = False  # ⭐ NEW
+    st.session_state.retrieval = None  # Reused by the analysis step
 
     st.session_state.messages.append({
         "role": "assistant",
@@ -131,7 +134,7 @@ if st.session_state.stage == "analyze" and not st.session_state.analysis_done:
             + " | ".join(st.session_state.answers)
         )
 
-        result = analyze(full_text)
+        result = analyze(full_text, st.session_state.retrieval)
 
     severity = result.get("severity", "unknown")
 
@@ -191,7 +194,8 @@ if user_input:
     if st.session_state.stage == "initial":
 
         st.session_state.symptom_text = user_input
-        st.session_state.followups = generate_followup_questions(user_input)
+        st.session_state.retrieval = run_sync(aretrieve(user_input))
+        st.session_state.followups = generate_followup_questions(user_input, st.session_state.retrieval)
 
         if not st.session_state.followups:
             st.session_state.followups = [
@@ -0,0 +1,100 @@
+"""
+Benchmark FAISS index types on a synthetic corpus.
+
+Reports build time, recall@k against exact (Flat) search and single-query
+p50/p99 latency for each FAISS_INDEX_TYPE, to pick a type and search knobs
+before loading a large corpus. Vectors are L2-normalized and searched by
+inner product (cosine), the same setup ingest.py builds for serving.
+
+    python bench_index.py --sizes 10000,100000 --dim 256
+    python bench_index.py --sizes 1000000 --types IVFFlat,IVFPQ --nprobe 16
+"""
+
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from index_factory import INDEX_TYPES, build_index, configure_search
+from config import FAISS_NPROBE, FAISS_HNSW_EF_SEARCH
+
+
+def synthetic_corpus(n_vectors: int, dim: int, n_queries: int, seed: int = 0):
+    """Clustered Gaussian vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    n_clusters = max(8, int(np.sqrt(n_vectors)))
+    centers = rng.normal(size=(n_clusters, dim)).astype("float32")
+    assignments = rng.integers(0, n_clusters, size=n_vectors)
+    corpus = centers[assignments] + 0.3 * rng.normal(size=(n_vectors, dim)).astype("float32")
+    picks = rng.integers(0, n_vectors, size=n_queries)
+    queries = corpus[picks] + 0.1 * rng.normal(size=(n_queries, dim)).astype("float32")
+    corpus, queries = corpus.astype("float32"), queries.astype("float32")
+    faiss.normalize_L2(corpus)
+    faiss.normalize_L2(queries)
+    return corpus, queries
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def bench(index_type: str, corpus, queries, truth, k: int, nprobe: int, ef_search: int) -> dict:
+    start = time.perf_counter()
+    index = build_index(corpus, index_type, metric=faiss.METRIC_INNER_PRODUCT)
+    index.add_with_ids(corpus, np.arange(len(corpus), dtype="int64"))
+    configure_search(index, nprobe=nprobe, ef_search=ef_search)
+    build_s = time.perf_counter() - start
+
+    latencies = []
+    found = np.empty((len(queries), k), dtype="int64")
+    for i, query in enumerate(queries):
+        t0 = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found[i] = ids[0]
+
+    return {
+        "type": index_type,
+        "build_s": build_s,
+        "recall": recall_at_k(found, truth),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated corpus sizes")
+    parser.add_argument("--dim", type=int, default=256, help="Vector dimension")
+    parser.add_argument("--queries", type=int, default=500, help="Number of queries")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours per query")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES), help="Comma-separated index types")
+    parser.add_argument("--nprobe", type=int, default=FAISS_NPROBE, help="IVF lists probed per query")
+    parser.add_argument("--ef-search", type=int, default=FAISS_HNSW_EF_SEARCH, help="HNSW efSearch")
+    parser.add_argument("--threads", type=int, default=0, help="FAISS OpenMP threads (0 = library default)")
+    args = parser.parse_args()
+
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+
+    types = [t.strip() for t in args.types.split(",") if t.strip()]
+    print(f"{'N':>9} {'type':<8} {'build s':>8} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        corpus, queries = synthetic_corpus(size, args.dim, args.queries)
+        exact = faiss.IndexFlatIP(args.dim)
+        exact.add(corpus)
+        _, truth = exact.search(queries, args.k)
+
+        for index_type in types:
+            r = bench(index_type, corpus, queries, truth, args.k, args.nprobe, args.ef_search)
+            print(
+                f"{size:>9} {r['type']:<8} {r['build_s']:>8.2f} {r['recall']:>9.3f} "
+                f"{r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
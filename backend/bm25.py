@@ -0,0 +1,151 @@
+"""
+In-process BM25 keyword index over knowledge chunks.
+
+Built during ingest and persisted next to index.faiss as flat postings
+arrays, so exact symptom phrases ("pain behind the eyes", "rice-water
+stool") can be matched even when dense retrieval misses them. Bigrams are
+indexed alongside unigrams so phrase matches outrank scattered words.
+
+    bm25/
+        vocab.json         # {"term": [postings_start, postings_end], ...}
+        postings_rows.npy  # int32 document rows, grouped by term
+        postings_tf.npy    # float32 term frequencies, aligned with rows
+        doc_ids.npy        # int64 chunk id for each document row
+        doc_len.npy        # float32 token count for each document row
+        meta.json          # k1, b, avgdl
+"""
+
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+BM25_DIR = "bm25"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have i in is it my of on or that the "
+    "this to was were with me im ive am been do does".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased unigrams (minus stopwords) followed by adjacent bigrams."""
+    words = [w for w in _TOKEN_RE.findall(text.lower()) if w not in STOPWORDS]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+def has_bm25(directory: str) -> bool:
+    return (Path(directory) / BM25_DIR / "vocab.json").exists()
+
+
+class BM25Index:
+    """Okapi BM25 over id-addressed documents."""
+
+    def __init__(self, vocab, rows, tfs, doc_ids, doc_len, k1: float = 1.5, b: float = 0.75):
+        self.vocab = vocab
+        self.rows = rows
+        self.tfs = tfs
+        self.doc_ids = doc_ids
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.avgdl = float(doc_len.mean()) if len(doc_len) else 0.0
+
+    @classmethod
+    def build(cls, texts: Dict[int, str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Index {chunk_id: text}."""
+        doc_ids = np.array(sorted(texts), dtype="int64")
+        doc_len = np.zeros(len(doc_ids), dtype="float32")
+        postings = defaultdict(list)
+        for row, chunk_id in enumerate(doc_ids):
+            tokens = tokenize(texts[int(chunk_id)])
+            doc_len[row] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings[term].append((row, tf))
+
+        vocab = {}
+        rows, tfs = [], []
+        for term in sorted(postings):
+            start = len(rows)
+            for row, tf in postings[term]:
+                rows.append(row)
+                tfs.append(tf)
+            vocab[term] = [start, len(rows)]
+
+        return cls(
+            vocab,
+            np.array(rows, dtype="int32"),
+            np.array(tfs, dtype="float32"),
+            doc_ids,
+            doc_len,
+            k1,
+            b,
+        )
+
+    def save(self, directory: str):
+        out = Path(directory) / BM25_DIR
+        out.mkdir(parents=True, exist_ok=True)
+        (out / "vocab.json").write_text(json.dumps(self.vocab), encoding="utf-8")
+        np.save(out / "postings_rows.npy", self.rows)
+        np.save(out / "postings_tf.npy", self.tfs)
+        np.save(out / "doc_ids.npy", self.doc_ids)
+        np.save(out / "doc_len.npy", self.doc_len)
+        (out / "meta.json").write_text(
+            json.dumps({"k1": self.k1, "b": self.b, "avgdl": self.avgdl}), encoding="utf-8"
+        )
+
+    @classmethod
+    def load(cls, directory: str) -> "BM25Index":
+        src = Path(directory) / BM25_DIR
+        meta = json.loads((src / "meta.json").read_text(encoding="utf-8"))
+        return cls(
+            json.loads((src / "vocab.json").read_text(encoding="utf-8")),
+            np.load(src / "postings_rows.npy", mmap_mode="r"),
+            np.load(src / "postings_tf.npy", mmap_mode="r"),
+            np.load(src / "doc_ids.npy", mmap_mode="r"),
+            np.load(src / "doc_len.npy", mmap_mode="r"),
+            meta["k1"],
+            meta["b"],
+        )
+
+    def search(self, query: str, k: int, allowed_ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Return up to k (chunk_id, bm25 score) pairs, best first, optionally only among allowed_ids."""
+        n_docs = len(self.doc_ids)
+        if n_docs == 0:
+            return []
+
+        scores = np.zeros(n_docs, dtype="float32")
+        for term in set(tokenize(query)):
+            span = self.vocab.get(term)
+            if span is None:
+                continue
+            rows = self.rows[span[0]:span[1]]
+            tf = self.tfs[span[0]:span[1]]
+            df = len(rows)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[rows] / self.avgdl)
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if allowed_ids is not None:
+            scores[~np.isin(self.doc_ids, allowed_ids)] = 0
+
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return []
+        top = matched[np.argsort(-scores[matched])[:k]]
+        return [(int(self.doc_ids[row]), float(scores[row])) for row in top]
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse ranked id lists: score(id) = sum of 1 / (k + rank)."""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
@@ -0,0 +1,111 @@
+"""
+Bounded in-memory caching for RAG responses.
+LRU eviction with entry-count, byte-size and TTL limits.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def normalize_query(query: str) -> str:
+    """
+    Build a canonical cache key for a combined symptom query.
+
+    Casefolds and collapses whitespace within each " | "-joined part.
+    Follow-up answers keep their order (and blanks): each one answers a
+    specific question.
+    """
+    return " | ".join(" ".join(part.casefold().split()) for part in query.split("|"))
+
+
+def _estimate_size(key: str, value: Any) -> int:
+    try:
+        return len(key) + len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return len(key) + len(repr(value))
+
+
+class TTLCache:
+    """Thread-safe LRU cache bounded by entry count, total bytes and age."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value or None, refreshing its LRU position."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, size = entry
+            if self.ttl_seconds > 0 and time.monotonic() > expires_at:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any):
+        """Insert or replace a value, evicting least recently used entries."""
+        size = _estimate_size(key, value)
+        if self.max_bytes > 0 and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, time.monotonic() + self.ttl_seconds, size)
+            self._bytes += size
+            while self._data and (
+                (self.max_entries > 0 and len(self._data) > self.max_entries)
+                or (self.max_bytes > 0 and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of size and hit/miss/eviction counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
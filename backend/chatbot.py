@@ -1,8 +1,16 @@
-from rag import rag_answer
+from rag import RetrievalContext, async_rag_answer, astream_rag_answer
+from llm import run_sync
 from adaptive_questions import generate_followup_questions
+from triage import emergency_response
+from keyword_matcher import KeywordMatcher
+from admission import Overloaded
+from metrics import ERRORS, timed
+from tracing import traced
+from config import TRIAGE_FAST_PATH_ENABLED, TRIAGE_STREAM_FULL_ANALYSIS
 from logger import get_logger
 import json
-from typing import Dict, List
+from contextlib import nullcontext
+from typing import AsyncContextManager, AsyncIterator, Callable, Dict, List, Optional
 
 logger = get_logger(__name__)
 
@@ -36,50 +44,38 @@ def collect_symptoms():
     return " | ".join(answers)
 
 
+# Lexicons are compiled once; each scoring call is a single pass over the text
+SEVERITY_MATCHER = KeywordMatcher.from_file("severity.json")
+CONFIDENCE_MATCHER = KeywordMatcher.from_file("confidence.json")
+
+
+def find_red_flags(symptom_text):
+    """Severe concepts present (and not negated) in the text, in order of appearance."""
+    return SEVERITY_MATCHER.find(symptom_text).get("severe", [])
+
+
 def calculate_severity(symptom_text):
-    text = symptom_text.lower()
-
-    severe_keywords = [
-        "chest pain",
-        "shortness of breath",
-        "breathing difficulty",
-        "confusion",
-        "bluish lips",
-        "seizure",
-        "unconscious",
-        "vomiting blood",
-        "severe bleeding"
-    ]
-
-    moderate_keywords = [
-        "high fever",
-        "persistent vomiting",
-        "severe weakness"
-    ]
-
-    if any(k in text for k in severe_keywords):
+    found = SEVERITY_MATCHER.find(symptom_text)
+
+    if found.get("severe"):
         return "Severe"
 
-    if any(k in text for k in moderate_keywords):
+    if found.get("moderate"):
         return "Moderate"
 
     return "Mild"
 
 
+def answered_by_triage(symptom_text):
+    """True when the triage fast path answers these symptoms before any LLM call."""
+    return TRIAGE_FAST_PATH_ENABLED and bool(find_red_flags(symptom_text))
+
+
 def calculate_confidence(symptom_text, severity):
     score = 65
-    text = symptom_text.lower()
-
-    smart_keywords = [
-        "thirst", "urination", "fatigue",
-        "weight loss", "blurred vision",
-        "fever", "cough", "rash",
-        "pain", "headache"
-    ]
 
-    for k in smart_keywords:
-        if k in text:
-            score += 4
+    # +4 per distinct symptom concept mentioned
+    score += 4 * len(CONFIDENCE_MATCHER.find(symptom_text).get("symptom", []))
 
     if severity == "Severe":
         score += 10
@@ -95,12 +91,54 @@ def normalize_list(value):
     return []
 
 
-def analyze(symptom_text: str) -> Dict:
+LIST_FIELDS = ("possible_conditions", "explanation", "home_care_tips", "when_to_see_doctor")
+
+ERROR_RESULT = {
+    "severity": "Unknown",
+    "confidence": "0%",
+    "possible_conditions": ["Medical evaluation recommended"],
+    "explanation": ["System error occurred during analysis."],
+    "home_care_tips": ["Seek professional medical advice."],
+    "when_to_see_doctor": ["Immediately if symptoms are severe."],
+    "disclaimer": "This is not a medical diagnosis. Consult a healthcare professional."
+}
+
+
+def build_result(severity: str, confidence: int, rag_data: Dict) -> Dict:
+    """Merge keyword scoring with the RAG answer into the API result shape."""
+    # Safe fallback
+    if (
+        not rag_data
+        or "possible_conditions" not in rag_data
+        or not rag_data["possible_conditions"]
+    ):
+        rag_data = {
+            "possible_conditions": ["Medical evaluation recommended"],
+            "explanation": ["Symptoms were not strongly matched."],
+            "home_care_tips": ["Rest", "Stay hydrated", "Monitor symptoms"],
+            "when_to_see_doctor": ["If symptoms persist or worsen"],
+            "disclaimer": "This is not a medical diagnosis."
+        }
+
+    result = {
+        "severity": severity,
+        "confidence": f"{confidence}%",
+        **{field: normalize_list(rag_data.get(field)) for field in LIST_FIELDS},
+        "disclaimer": rag_data.get("disclaimer") or DEFAULT_DISCLAIMER
+    }
+    
+    logger.info(f"✅ Analysis complete: {result['severity']} ({result['confidence']})")
+    return result
+
+
+@traced("analyze")
+async def async_analyze(symptom_text: str, retrieval: Optional[RetrievalContext] = None) -> Dict:
     """
     Analyze symptoms and return structured medical guidance.
     
     Args:
         symptom_text: Combined symptom description and follow-up answers
+        retrieval: Retrieval from the follow-up step of this conversation, reused instead of re-embedding
         
     Returns:
         Dict with severity, confidence, conditions, care tips, warnings, and disclaimer
@@ -109,49 +147,96 @@ def analyze(symptom_text: str) -> Dict:
     logger.info(f"🧠 Analyzing symptoms: length={len(symptom_text)}")
 
     try:
-        severity = calculate_severity(symptom_text)
-        confidence = calculate_confidence(symptom_text, severity)
-
-        rag_data = rag_answer(symptom_text)
-
-        # Safe fallback
-        if (
-            not rag_data
-            or "possible_conditions" not in rag_data
-            or not rag_data["possible_conditions"]
-        ):
-            rag_data = {
-                "possible_conditions": ["Medical evaluation recommended"],
-                "explanation": ["Symptoms were not strongly matched."],
-                "home_care_tips": ["Rest", "Stay hydrated", "Monitor symptoms"],
-                "when_to_see_doctor": ["If symptoms persist or worsen"],
-                "disclaimer": "This is not a medical diagnosis."
-            }
-
-        result = {
-            "severity": severity,
-            "confidence": f"{confidence}%",
-            "possible_conditions": normalize_list(rag_data.get("possible_conditions")),
-            "explanation": normalize_list(rag_data.get("explanation")),
-            "home_care_tips": normalize_list(rag_data.get("home_care_tips")),
-            "when_to_see_doctor": normalize_list(rag_data.get("when_to_see_doctor")),
-            "disclaimer": rag_data.get("disclaimer") or DEFAULT_DISCLAIMER
-        }
-        
-        logger.info(f"✅ Analysis complete: {result['severity']} ({result['confidence']})")
-        return result
-        
+        with timed("score"):
+            severity = calculate_severity(symptom_text)
+            confidence = calculate_confidence(symptom_text, severity)
+
+        # 🚨 Red flags are answered from the emergency template without the LLM
+        if severity == "Severe" and TRIAGE_FAST_PATH_ENABLED:
+            with timed("triage"):
+                triage_data = emergency_response(symptom_text, find_red_flags(symptom_text))
+            return build_result(severity, confidence, triage_data)
+
+        rag_data = await async_rag_answer(symptom_text, retrieval=retrieval)
+        return build_result(severity, confidence, rag_data)
+
+    except Overloaded:
+        # No slot to compute in after an identical in-flight query was abandoned
+        raise
+
     except Exception as e:
+        ERRORS.inc(stage="analyze")
         logger.error(f"❌ Analyze failed: {e}")
-        return {
-            "severity": "Unknown",
-            "confidence": "0%",
-            "possible_conditions": ["Medical evaluation recommended"],
-            "explanation": ["System error occurred during analysis."],
-            "home_care_tips": ["Seek professional medical advice."],
-            "when_to_see_doctor": ["Immediately if symptoms are severe."],
-            "disclaimer": "This is not a medical diagnosis. Consult a healthcare professional."
-        }
+        return dict(ERROR_RESULT)
+
+
+@traced("analyze")
+async def astream_analyze(symptom_text: str, retrieval: Optional[RetrievalContext] = None,
+                          admit: Optional[Callable[[], AsyncContextManager]] = None) -> AsyncIterator[Dict]:
+    """
+    Streaming variant of async_analyze.
+
+    Yields {"type": "partial", "field": ..., "data": ...} frames as soon as
+    each field is known (severity and confidence first, then each LLM field
+    as it closes), followed by one {"type": "analysis", "data": ...} frame.
+
+    For Severe red flags a {"type": "triage", "data": ...} frame with the
+    emergency guidance comes first; the LLM analysis follows only when
+    TRIAGE_STREAM_FULL_ANALYSIS is on, otherwise the triage result is also
+    the final analysis.
+
+    admit (e.g. AdmissionController.admit) is entered just before the LLM
+    stream, so the triage frame never queues but the analysis after it
+    holds a slot and the request deadline. If the server is overloaded
+    after a triage frame, the triage result becomes the final analysis.
+    """
+    
+    logger.info(f"🧠 Streaming analysis: length={len(symptom_text)}")
+
+    try:
+        with timed("score"):
+            severity = calculate_severity(symptom_text)
+            confidence = calculate_confidence(symptom_text, severity)
+        yield {"type": "partial", "field": "severity", "data": severity}
+        yield {"type": "partial", "field": "confidence", "data": f"{confidence}%"}
+
+        if severity == "Severe" and TRIAGE_FAST_PATH_ENABLED:
+            with timed("triage"):
+                triage_data = emergency_response(symptom_text, find_red_flags(symptom_text))
+            triage_result = build_result(severity, confidence, triage_data)
+            yield {"type": "triage", "data": triage_result}
+            if not TRIAGE_STREAM_FULL_ANALYSIS:
+                yield {"type": "analysis", "data": triage_result}
+                return
+
+        rag_data = None
+        async with admit() if admit is not None else nullcontext():
+            async for event in astream_rag_answer(symptom_text, retrieval=retrieval):
+                if event["type"] == "result":
+                    rag_data = event["data"]
+                elif event["field"] in LIST_FIELDS:
+                    yield {"type": "partial", "field": event["field"], "data": normalize_list(event["data"])}
+                elif event["field"] == "disclaimer":
+                    yield {"type": "partial", "field": "disclaimer", "data": event["data"]}
+
+        yield {"type": "analysis", "data": build_result(severity, confidence, rag_data)}
+
+    except Overloaded:
+        if severity == "Severe" and TRIAGE_FAST_PATH_ENABLED:
+            logger.warning("🚦 No capacity for the full analysis, the triage result stands")
+            yield {"type": "analysis", "data": triage_result}
+            return
+        raise
+
+    except Exception as e:
+        ERRORS.inc(stage="analyze")
+        logger.error(f"❌ Streaming analyze failed: {e}")
+        yield {"type": "analysis", "data": dict(ERROR_RESULT)}
+
+
+def analyze(symptom_text: str, retrieval: Optional[RetrievalContext] = None) -> Dict:
+    """Synchronous wrapper around async_analyze for the CLI and Streamlit app."""
+    return run_sync(async_analyze(symptom_text, retrieval))
 
 
 if __name__ == "__main__":
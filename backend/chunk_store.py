@@ -0,0 +1,101 @@
+"""
+Memory-mapped columnar storage for knowledge chunks.
+
+Replaces chunks.pkl with plain arrays that every worker process maps
+read-only (sharing the OS page cache), and materializes a LangChain
+Document only when a chunk is actually returned by a search:
+
+    chunks/
+        ids.npy            # int64 chunk ids, sorted
+        text_offsets.npy   # int64, len(ids) + 1 byte offsets into text.bin
+        text.bin           # concatenated UTF-8 page_content
+        meta_offsets.npy   # int64, len(ids) + 1 byte offsets into meta.bin
+        meta.bin           # concatenated UTF-8 JSON metadata
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+CHUNK_STORE_DIR = "chunks"
+
+
+def _write_column(directory: Path, name: str, values):
+    offsets = np.zeros(len(values) + 1, dtype="int64")
+    with open(directory / f"{name}.bin", "wb") as f:
+        for i, value in enumerate(values):
+            data = value.encode("utf-8")
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+    np.save(directory / f"{name}_offsets.npy", offsets)
+
+
+def write_chunk_store(directory: str, chunks: Dict[int, Document]):
+    """Write {chunk_id: Document} as a columnar chunk store under directory."""
+    store_dir = Path(directory) / CHUNK_STORE_DIR
+    store_dir.mkdir(parents=True, exist_ok=True)
+    ids = sorted(chunks)
+    np.save(store_dir / "ids.npy", np.array(ids, dtype="int64"))
+    _write_column(store_dir, "text", [chunks[i].page_content for i in ids])
+    _write_column(store_dir, "meta", [json.dumps(chunks[i].metadata, ensure_ascii=False) for i in ids])
+
+
+def has_chunk_store(directory: str) -> bool:
+    return (Path(directory) / CHUNK_STORE_DIR / "ids.npy").exists()
+
+
+def _map_blob(path: Path):
+    # np.memmap cannot map an empty file
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype="uint8")
+    return np.memmap(path, dtype="uint8", mode="r")
+
+
+class ChunkStore:
+    """Read-only, memory-mapped view of a chunk store, indexed by chunk id."""
+
+    def __init__(self, directory: str):
+        store_dir = Path(directory) / CHUNK_STORE_DIR
+        self.ids = np.load(store_dir / "ids.npy", mmap_mode="r")
+        self._text_offsets = np.load(store_dir / "text_offsets.npy", mmap_mode="r")
+        self._text = _map_blob(store_dir / "text.bin")
+        self._meta_offsets = np.load(store_dir / "meta_offsets.npy", mmap_mode="r")
+        self._meta = _map_blob(store_dir / "meta.bin")
+
+    def _row(self, chunk_id) -> int:
+        row = int(np.searchsorted(self.ids, chunk_id))
+        if row >= len(self.ids) or self.ids[row] != chunk_id:
+            raise KeyError(chunk_id)
+        return row
+
+    def _document(self, row: int) -> Document:
+        text = bytes(self._text[self._text_offsets[row]:self._text_offsets[row + 1]]).decode("utf-8")
+        meta = bytes(self._meta[self._meta_offsets[row]:self._meta_offsets[row + 1]]).decode("utf-8")
+        return Document(page_content=text, metadata=json.loads(meta))
+
+    def __getitem__(self, chunk_id) -> Document:
+        return self._document(self._row(chunk_id))
+
+    def get(self, chunk_id, default=None):
+        try:
+            return self[chunk_id]
+        except KeyError:
+            return default
+
+    def __contains__(self, chunk_id) -> bool:
+        try:
+            self._row(chunk_id)
+            return True
+        except KeyError:
+            return False
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def items(self) -> Iterator[Tuple[int, Document]]:
+        for row, chunk_id in enumerate(self.ids):
+            yield int(chunk_id), self._document(row)
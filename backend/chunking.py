@@ -0,0 +1,118 @@
+"""
+Structure-aware chunking of the medical knowledge markdown.
+
+Knowledge files share one layout:
+
+    # Dengue Fever
+    ## Category
+    Viral Infection (Mosquito-borne)
+    ---
+    ## Common Symptoms
+    - Sudden high fever
+    ...
+
+Each "## " section becomes one chunk tagged with body system, disease,
+category and section, so retrieval returns whole, non-overlapping
+sections and the prompt can be assembled from exactly the sections it
+needs. Sections longer than SECTION_MAX_CHARS are split further; files
+without sections fall back to the generic recursive splitter.
+"""
+
+import re
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from config import SECTION_MAX_CHARS
+
+_TITLE_RE = re.compile(r"^#\s+(.+?)\s*$", re.MULTILINE)
+_SECTION_RE = re.compile(r"^##\s+(.+?)\s*$", re.MULTILINE)
+_RULE_RE = re.compile(r"^\s*-{3,}\s*$", re.MULTILINE)
+
+# Created lazily once per (ingest worker) process
+_recursive_splitter = None
+_section_splitter = None
+
+
+def _splitters():
+    global _recursive_splitter, _section_splitter
+    if _recursive_splitter is None:
+        # ✅ Medical-optimized chunking for unstructured files
+        _recursive_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=500,
+            chunk_overlap=100,
+            separators=["\n## ", "\n### ", "\n- ", "\n", " "],
+        )
+        _section_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=SECTION_MAX_CHARS,
+            chunk_overlap=0,
+            separators=["\n### ", "\n\n", "\n- ", "\n", " "],
+        )
+    return _recursive_splitter, _section_splitter
+
+
+def section_key(heading: str) -> str:
+    """
+    Canonical key for a section heading.
+
+    "Emergency Signs (DO NOT IGNORE)" and "Emergency Signs — Hypertensive
+    Crisis" both map to "emergency_signs"; "When to See a Doctor" maps to
+    "when_to_see_a_doctor".
+    """
+    heading = re.split(r"[(—:]", heading, maxsplit=1)[0]
+    return re.sub(r"[^a-z0-9]+", "_", heading.lower()).strip("_")
+
+
+def body_system(source: str) -> str:
+    """Partition of a knowledge file: its top-level folder ("respiratory/asthma.md" -> "respiratory")."""
+    return source.split("/", 1)[0] if "/" in source else ""
+
+
+def _clean(body: str) -> str:
+    # Drop "---" rules, trailing spaces and blank-line runs: fewer prompt tokens
+    body = _RULE_RE.sub("", body)
+    lines = [line.rstrip() for line in body.strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def parse_sections(content: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """Split markdown into its "# " title and a list of ("## " heading, body) pairs."""
+    title_match = _TITLE_RE.search(content)
+    title = title_match.group(1).strip() if title_match else ""
+
+    headings = list(_SECTION_RE.finditer(content))
+    sections = []
+    for i, match in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(content)
+        body = _clean(content[match.end():end])
+        if body:
+            sections.append((match.group(1).strip(), body))
+    return title, sections
+
+
+def chunk_markdown(content: str, source: str) -> List[Document]:
+    """Chunk one knowledge file: one Document per section, with section metadata."""
+    recursive, section_splitter = _splitters()
+    title, sections = parse_sections(content)
+    if not sections:
+        return recursive.split_documents([Document(page_content=content, metadata={"source": source})])
+
+    disease = title or source.rsplit("/", 1)[-1].removesuffix(".md").replace("_", " ").title()
+    category = next((body.splitlines()[0] for heading, body in sections if section_key(heading) == "category"), "")
+
+    chunks = []
+    for heading, body in sections:
+        metadata = {
+            "source": source,
+            "body_system": body_system(source),
+            "disease": disease,
+            "category": category,
+            "section": heading,
+            "section_key": section_key(heading),
+        }
+        # The heading line keeps each chunk self-describing once it is cut out of its file
+        header = f"{disease} — {heading}\n"
+        parts = [body] if len(body) <= SECTION_MAX_CHARS else section_splitter.split_text(body)
+        chunks.extend(Document(page_content=header + part, metadata=dict(metadata)) for part in parts)
+    return chunks
@@ -38,6 +38,10 @@ HOST = os.getenv("HOST", "127.0.0.1")
 PORT = safe_env_int("PORT", 8000)
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_QUEUE_SIZE = safe_env_int("LOG_QUEUE_SIZE", 10000)  # Records beyond this backlog are dropped, not waited on
+LOG_BATCH_SIZE = safe_env_int("LOG_BATCH_SIZE", 256)  # Records written per flush by the background writer
+LOG_SAMPLE_BURST = safe_env_int("LOG_SAMPLE_BURST", 100)  # DEBUG/INFO records kept per call site per minute (0 = no sampling)
+LOG_SAMPLE_RATE = safe_env_float("LOG_SAMPLE_RATE", 0.1)  # Fraction kept beyond the burst
 
 # ============= LLM CONFIG (OpenRouter) =============
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
@@ -47,26 +51,98 @@ LLM_MAX_TOKENS = safe_env_int("LLM_MAX_TOKENS", 512)
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 
 # ============= EMBEDDINGS CONFIG =============
-# Using OpenRouter/OpenAI compatible API for embeddings
-EMBEDDINGS_MODEL = os.getenv("EMBEDDINGS_MODEL", "text-embedding-3-small")
+# openrouter (OpenAI-compatible API) | local (sentence-transformers on CPU) | hashing (offline/tests)
+EMBEDDINGS_PROVIDER = os.getenv("EMBEDDINGS_PROVIDER", "openrouter").lower()
+EMBEDDINGS_DIM = safe_env_int("EMBEDDINGS_DIM", 384)  # hashing provider only
+_DEFAULT_EMBEDDINGS_MODELS = {
+    "openrouter": "text-embedding-3-small",
+    "local": "sentence-transformers/all-MiniLM-L6-v2",
+    "hashing": f"hashing-{EMBEDDINGS_DIM}",
+}
+EMBEDDINGS_MODEL = os.getenv("EMBEDDINGS_MODEL", _DEFAULT_EMBEDDINGS_MODELS.get(EMBEDDINGS_PROVIDER, "text-embedding-3-small"))
+EMBEDDINGS_BATCH_SIZE = safe_env_int("EMBEDDINGS_BATCH_SIZE", 64)
+EMBEDDINGS_THREADS = safe_env_int("EMBEDDINGS_THREADS", 2)
+INGEST_WORKERS = safe_env_int("INGEST_WORKERS", 0)  # 0 = one per CPU core
+INGEST_EMBED_BATCH_SIZE = safe_env_int("INGEST_EMBED_BATCH_SIZE", 64)
+INGEST_EMBED_CONCURRENCY = safe_env_int("INGEST_EMBED_CONCURRENCY", 4)
+INGEST_EMBED_MAX_RETRIES = safe_env_int("INGEST_EMBED_MAX_RETRIES", 5)
+INGEST_EMBED_BACKOFF_SECONDS = safe_env_float("INGEST_EMBED_BACKOFF_SECONDS", 1.0)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "True").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache/embeddings.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = safe_env_int("EMBEDDING_CACHE_MAX_ENTRIES", 200000)  # Oldest vectors pruned beyond this (0 = no cap)
 
 # ============= DATABASE CONFIG =============
 FAISS_INDEX_DIR = os.getenv("FAISS_INDEX_DIR", "faiss_index")
 MEDICAL_KNOWLEDGE_PATH = os.getenv("MEDICAL_KNOWLEDGE_PATH", "medical_knowledge")
+LEXICON_DIR = os.getenv("LEXICON_DIR", "lexicons")  # Severity/confidence keyword lexicons (JSON)
+SECTION_MAX_CHARS = safe_env_int("SECTION_MAX_CHARS", 1500)  # Longer knowledge sections are split further
+INDEX_RELOAD_INTERVAL_SECONDS = safe_env_int("INDEX_RELOAD_INTERVAL_SECONDS", 30)  # 0 disables polling
+
+# ============= VECTOR INDEX CONFIG =============
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "Flat")  # Flat | IVFFlat | HNSW | IVFPQ
+FAISS_NLIST = safe_env_int("FAISS_NLIST", 0)  # IVF lists; 0 = derive from corpus size
+FAISS_NPROBE = safe_env_int("FAISS_NPROBE", 8)
+FAISS_HNSW_M = safe_env_int("FAISS_HNSW_M", 32)
+FAISS_HNSW_EF_CONSTRUCTION = safe_env_int("FAISS_HNSW_EF_CONSTRUCTION", 200)
+FAISS_HNSW_EF_SEARCH = safe_env_int("FAISS_HNSW_EF_SEARCH", 64)
+FAISS_PQ_M = safe_env_int("FAISS_PQ_M", 16)
+FAISS_PQ_NBITS = safe_env_int("FAISS_PQ_NBITS", 8)
 
 # ============= RAG CONFIG =============
-RAG_SCORE_THRESHOLD = safe_env_float("RAG_SCORE_THRESHOLD", 0.55)
+RAG_SCORE_THRESHOLD = safe_env_float("RAG_SCORE_THRESHOLD", 0.3)  # Minimum cosine similarity of a retrieved chunk
 RAG_K_RESULTS = safe_env_int("RAG_K_RESULTS", 5)
+# Sections sent to the LLM for every candidate disease, besides the matched ones
+RAG_CONTEXT_SECTIONS = [
+    s.strip() for s in os.getenv("RAG_CONTEXT_SECTIONS", "diagnostic_hint,common_symptoms").split(",") if s.strip()
+]
+RAG_HYBRID_ENABLED = os.getenv("RAG_HYBRID_ENABLED", "True").lower() == "true"
+RAG_HYBRID_CANDIDATES = safe_env_int("RAG_HYBRID_CANDIDATES", 20)  # Per-retriever candidates before fusion
+RAG_RRF_K = safe_env_int("RAG_RRF_K", 60)
+RAG_ROUTER_ENABLED = os.getenv("RAG_ROUTER_ENABLED", "False").lower() == "true"  # Boosts, never filters
+RAG_ROUTER_MAX_PARTITIONS = safe_env_int("RAG_ROUTER_MAX_PARTITIONS", 3)  # Body systems searched per routed query
+RAG_ROUTER_MIN_SHARE = safe_env_float("RAG_ROUTER_MIN_SHARE", 0.5)  # Keep partitions scoring >= this share of the best
 RAG_CACHE_ENABLED = os.getenv("RAG_CACHE_ENABLED", "True").lower() == "true"
+RAG_CACHE_MAX_ENTRIES = safe_env_int("RAG_CACHE_MAX_ENTRIES", 1000)
+RAG_CACHE_MAX_BYTES = safe_env_int("RAG_CACHE_MAX_BYTES", 10 * 1024 * 1024)
+RAG_CACHE_TTL_SECONDS = safe_env_int("RAG_CACHE_TTL_SECONDS", 3600)
+RAG_SEMANTIC_CACHE_ENABLED = os.getenv("RAG_SEMANTIC_CACHE_ENABLED", "True").lower() == "true"
+RAG_SEMANTIC_CACHE_MAX_DISTANCE = safe_env_float("RAG_SEMANTIC_CACHE_MAX_DISTANCE", 0.08)
+RAG_SEMANTIC_CACHE_MAX_ENTRIES = safe_env_int("RAG_SEMANTIC_CACHE_MAX_ENTRIES", 5000)
+RAG_SEMANTIC_CACHE_TTL_SECONDS = safe_env_int("RAG_SEMANTIC_CACHE_TTL_SECONDS", 3600)
+RAG_SINGLE_FLIGHT_ENABLED = os.getenv("RAG_SINGLE_FLIGHT_ENABLED", "True").lower() == "true"  # Coalesce concurrent identical queries
+
+# ============= TRIAGE CONFIG =============
+TRIAGE_FAST_PATH_ENABLED = os.getenv("TRIAGE_FAST_PATH_ENABLED", "True").lower() == "true"  # Answer red flags without the LLM
+TRIAGE_STREAM_FULL_ANALYSIS = os.getenv("TRIAGE_STREAM_FULL_ANALYSIS", "True").lower() == "true"  # WebSocket: stream the LLM analysis after the triage frame
+TRIAGE_MAX_WARNING_SIGNS = safe_env_int("TRIAGE_MAX_WARNING_SIGNS", 5)
+
+# ============= ADMISSION CONFIG =============
+ANALYSIS_MAX_CONCURRENCY = safe_env_int("ANALYSIS_MAX_CONCURRENCY", 8)  # Analyses running at once; 0 = unlimited
+ANALYSIS_MAX_QUEUE = safe_env_int("ANALYSIS_MAX_QUEUE", 32)  # Requests waiting for a slot before 503s
+ANALYSIS_DEADLINE_SECONDS = safe_env_float("ANALYSIS_DEADLINE_SECONDS", 45.0)  # Per request, queueing included; 0 = none
+
+# ============= OBSERVABILITY CONFIG =============
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"  # Prometheus metrics at GET /metrics
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "True").lower() == "true"  # Per-request spans as JSON lines
+TRACE_FILE = os.getenv("TRACE_FILE", "logs/traces.jsonl")
+TRACE_SAMPLE_RATE = safe_env_float("TRACE_SAMPLE_RATE", 1.0)  # Fraction of requests traced
+TRACE_MAX_BYTES = safe_env_int("TRACE_MAX_BYTES", 20 * 1024 * 1024)  # Rotate to TRACE_FILE.1 past this size
+TRACE_QUEUE_SIZE = safe_env_int("TRACE_QUEUE_SIZE", 10000)  # Spans beyond this backlog are dropped
 
 # ============= SESSION CONFIG =============
 SESSION_TIMEOUT_MINUTES = safe_env_int("SESSION_TIMEOUT_MINUTES", 30)
 MAX_FOLLOWUP_QUESTIONS = safe_env_int("MAX_FOLLOWUP_QUESTIONS", 3)
+FOLLOWUP_CACHE_ENABLED = os.getenv("FOLLOWUP_CACHE_ENABLED", "True").lower() == "true"
+FOLLOWUP_CACHE_MAX_ENTRIES = safe_env_int("FOLLOWUP_CACHE_MAX_ENTRIES", 2000)
+FOLLOWUP_CACHE_TTL_SECONDS = safe_env_int("FOLLOWUP_CACHE_TTL_SECONDS", 86400)
+FOLLOWUP_CACHE_MAX_UNMATCHED_WORDS = safe_env_int("FOLLOWUP_CACHE_MAX_UNMATCHED_WORDS", 3)  # More uncovered words = not cached
+FOLLOWUP_CACHE_PATH = os.getenv("FOLLOWUP_CACHE_PATH", "followup_cache/questions.json")  # Written by: python question_cache.py
 
 # ============= API CONFIG =============
 ENABLE_CORS = os.getenv("ENABLE_CORS", "True").lower() == "true"
 ALLOWED_ORIGINS = [o.strip() for o in os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://localhost:8000").split(",") if o.strip()]
 RATE_LIMIT_PER_MINUTE = safe_env_int("RATE_LIMIT_PER_MINUTE", 10)
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
 
 # ============= VALIDATION =============
 def validate_config():
@@ -0,0 +1,169 @@
+"""
+Persistent on-disk embedding cache.
+Vectors are stored in SQLite keyed by a hash of (model, text), so re-ingesting
+an unchanged corpus and repeated queries skip the embedding API entirely.
+The store holds at most EMBEDDING_CACHE_MAX_ENTRIES vectors; the oldest
+written are pruned first. Async callers do all SQLite work on a worker
+thread, off the event loop.
+"""
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from logger import get_logger
+from config import EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_PATH
+
+logger = get_logger(__name__)
+
+
+def content_key(namespace: str, text: str) -> str:
+    """Stable cache key for a text embedded by a given model."""
+    return hashlib.sha256(f"{namespace}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """SQLite table of float32 vectors keyed by content hash, capped at max_entries (0 = no cap)."""
+
+    def __init__(self, path: str, max_entries: int = 0):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL, created REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if "created" not in columns:
+            # Stores written before the size cap existed
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN created REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_created ON embeddings (created)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype="float32")
+        return found
+
+    def put_many(self, items: Dict[str, Iterable[float]]):
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            arr = np.asarray(vector, dtype="float32")
+            rows.append((key, arr.shape[0], arr.tobytes(), now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vector, created) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            # Upper bound: replaced keys are counted too, and corrected when pruning
+            self._count += len(rows)
+            if self.max_entries > 0 and self._count > self.max_entries:
+                self._prune()
+            self._conn.commit()
+
+    def _prune(self):
+        """Delete the oldest vectors down to 90% of the cap, so pruning is not needed on every write."""
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._count - int(self.max_entries * 0.9)
+        if self._count <= self.max_entries or excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY created LIMIT ?)",
+            (excess,)
+        )
+        self._count -= excess
+        self.evicted += excess
+        logger.info(f"🧹 Embedding cache pruned {excess} oldest vectors")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that consults an EmbeddingStore first.
+
+    Only texts missing from the store are sent to the wrapped client, and
+    their vectors are written back for the next run.
+    """
+
+    def __init__(self, base: Embeddings, store: EmbeddingStore, namespace: str):
+        self.base = base
+        self.store = store
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, texts: List[str]):
+        keys = [content_key(self.namespace, t) for t in texts]
+        found = self.store.get_many(keys)
+        missing = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in found))
+        self.hits += len(texts) - sum(1 for k in keys if k not in found)
+        self.misses += len(missing)
+        return keys, found, missing
+
+    def _merge(self, keys, found, missing, vectors) -> List[List[float]]:
+        if missing:
+            fresh = {content_key(self.namespace, t): v for t, v in zip(missing, vectors)}
+            self.store.put_many(fresh)
+            found.update({k: np.asarray(v, dtype="float32") for k, v in fresh.items()})
+        return [found[k].tolist() for k in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts)
+        vectors = self.base.embed_documents(missing) if missing else []
+        return self._merge(keys, found, missing, vectors)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = await asyncio.to_thread(self._lookup, texts)
+        vectors = await self.base.aembed_documents(missing) if missing else []
+        return await asyncio.to_thread(self._merge, keys, found, missing, vectors)
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, found, missing = self._lookup([text])
+        vectors = [self.base.embed_query(text)] if missing else []
+        return self._merge(keys, found, missing, vectors)[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, found, missing = await asyncio.to_thread(self._lookup, [text])
+        vectors = [await self.base.aembed_query(text)] if missing else []
+        return (await asyncio.to_thread(self._merge, keys, found, missing, vectors))[0]
+
+
+def with_embedding_cache(embeddings: Embeddings, namespace: str) -> Embeddings:
+    """Wrap an embeddings client with the persistent cache when enabled."""
+    if not EMBEDDING_CACHE_ENABLED:
+        return embeddings
+    try:
+        store = EmbeddingStore(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES)
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️  Embedding cache unavailable at {EMBEDDING_CACHE_PATH}: {e}")
+        return embeddings
+    logger.info(f"📦 Embedding cache enabled at {EMBEDDING_CACHE_PATH}")
+    return CachedEmbeddings(embeddings, store, namespace)
@@ -0,0 +1,260 @@
+"""
+Pluggable embedding providers shared by ingest and retrieval.
+
+Selected with EMBEDDINGS_PROVIDER:
+    openrouter   remote OpenAI-compatible API (default)
+    local        sentence-transformers model on CPU, no network round trip
+    hashing      hashed TF-IDF projection; dependency-free, for tests/offline
+"""
+
+import asyncio
+import hashlib
+import itertools
+import math
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from pydantic import SecretStr
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+from logger import get_logger
+from embedding_store import with_embedding_cache
+from config import (
+    EMBEDDINGS_PROVIDER,
+    EMBEDDINGS_MODEL,
+    EMBEDDINGS_DIM,
+    EMBEDDINGS_BATCH_SIZE,
+    EMBEDDINGS_THREADS,
+    OPENROUTER_API_KEY,
+    OPENROUTER_BASE_URL,
+    INGEST_EMBED_BATCH_SIZE,
+    INGEST_EMBED_CONCURRENCY,
+    INGEST_EMBED_MAX_RETRIES,
+    INGEST_EMBED_BACKOFF_SECONDS,
+)
+
+logger = get_logger(__name__)
+
+PROVIDERS = ("openrouter", "local", "hashing")
+
+
+class _ThreadPooledEmbeddings(Embeddings):
+    """Base for CPU-bound providers: async calls run on a dedicated pool."""
+
+    def __init__(self, threads: int):
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="embed")
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.embed_query, text)
+
+
+class LocalEmbeddings(_ThreadPooledEmbeddings):
+    """sentence-transformers model run on CPU in batches."""
+
+    def __init__(self, model_name: str, batch_size: int, threads: int):
+        if SentenceTransformer is None:
+            raise ImportError(
+                "EMBEDDINGS_PROVIDER=local requires sentence-transformers. "
+                "Install with: pip install sentence-transformers"
+            )
+        super().__init__(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.model.encode(
+            texts, batch_size=self.batch_size, normalize_embeddings=True, show_progress_bar=False
+        )
+        return vectors.astype("float32").tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class HashingEmbeddings(_ThreadPooledEmbeddings):
+    """
+    Signed feature hashing of unigrams and bigrams with sublinear TF.
+
+    Needs no model or network, so it is useful for tests and offline
+    development; retrieval quality is keyword-level only.
+    """
+
+    _TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+    def __init__(self, dimension: int, threads: int):
+        super().__init__(threads)
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> List[float]:
+        words = self._TOKEN_RE.findall(text.lower())
+        features: Dict[str, int] = {}
+        for term in words + [f"{a}_{b}" for a, b in zip(words, words[1:])]:
+            features[term] = features.get(term, 0) + 1
+
+        vec = np.zeros(self.dimension, dtype="float32")
+        for term, tf in features.items():
+            digest = hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest()
+            h = int.from_bytes(digest, "little")
+            sign = 1.0 if h & 1 else -1.0
+            vec[(h >> 1) % self.dimension] += sign * (1.0 + math.log(tf))
+
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def _create_provider() -> Embeddings:
+    if EMBEDDINGS_PROVIDER == "openrouter":
+        # Imported lazily so local providers work without the OpenAI client configured
+        from langchain_openai import OpenAIEmbeddings
+
+        if not OPENROUTER_API_KEY:
+            raise ValueError("OPENROUTER_API_KEY not set in .env")
+        return OpenAIEmbeddings(
+            api_key=SecretStr(OPENROUTER_API_KEY),
+            model=EMBEDDINGS_MODEL,
+            base_url=OPENROUTER_BASE_URL
+        )
+    if EMBEDDINGS_PROVIDER == "local":
+        return LocalEmbeddings(EMBEDDINGS_MODEL, EMBEDDINGS_BATCH_SIZE, EMBEDDINGS_THREADS)
+    if EMBEDDINGS_PROVIDER == "hashing":
+        return HashingEmbeddings(EMBEDDINGS_DIM, EMBEDDINGS_THREADS)
+    raise ValueError(f"Unknown EMBEDDINGS_PROVIDER '{EMBEDDINGS_PROVIDER}'. Use one of: {', '.join(PROVIDERS)}")
+
+
+def embeddings_metadata() -> Dict[str, str]:
+    """Identify the configured provider; recorded in the index manifest."""
+    return {"embeddings_provider": EMBEDDINGS_PROVIDER, "embeddings_model": EMBEDDINGS_MODEL}
+
+
+def get_embeddings() -> Embeddings:
+    """Create the configured embeddings provider, wrapped with the persistent cache."""
+    provider = _create_provider()
+    logger.info(f"✅ Using {EMBEDDINGS_PROVIDER} embeddings: {EMBEDDINGS_MODEL}")
+    return with_embedding_cache(provider, namespace=f"{EMBEDDINGS_PROVIDER}:{EMBEDDINGS_MODEL}")
+
+
+# ============= BATCHED INGEST EMBEDDING =============
+def _retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds to wait before retrying, or None if the error is not retryable.
+
+    Retries rate limits (429), server errors (5xx), timeouts and dropped
+    connections; honours a Retry-After header when the API sends one.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    name = type(error).__name__
+    if status is None and name not in ("APITimeoutError", "APIConnectionError", "TimeoutError"):
+        return None
+    if status is not None and status != 429 and status < 500:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _take(source: Iterator[str], size: int) -> List[str]:
+    return list(itertools.islice(source, size))
+
+
+async def aembed_in_batches(embeddings: Embeddings, texts: Iterable[str]) -> np.ndarray:
+    """
+    Embed texts in bounded batches sent concurrently, into one float32 array.
+
+    texts may be a lazy iterator (e.g. chunks streamed out of the ingest
+    process pool); it is consumed off the event loop one batch at a time,
+    only when a request slot is free. At most INGEST_EMBED_CONCURRENCY
+    batches are in flight. Failed batches are retried with exponential
+    backoff; a 429 also pauses every worker until the rate-limit window
+    has passed. Batches that finished before an interruption are already
+    in the persistent embedding cache, so a re-run resumes instead of
+    starting over.
+    """
+    loop = asyncio.get_running_loop()
+    source = iter(texts)
+    semaphore = asyncio.Semaphore(INGEST_EMBED_CONCURRENCY)
+    state = {"out": None, "done": 0, "paused_until": 0.0}
+    started = time.perf_counter()
+
+    def store(start: int, block: np.ndarray):
+        # Grow geometrically when the total is unknown up front
+        end = start + len(block)
+        out = state["out"]
+        if out is None or end > len(out):
+            grown = np.empty((max(end, 2 * (0 if out is None else len(out)), 1024), block.shape[1]), dtype="float32")
+            if out is not None:
+                grown[:len(out)] = out
+            state["out"] = out = grown
+        out[start:end] = block
+
+    async def run_batch(start: int, batch: List[str]):
+        try:
+            for attempt in range(INGEST_EMBED_MAX_RETRIES + 1):
+                wait = state["paused_until"] - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                try:
+                    vectors = await embeddings.aembed_documents(batch)
+                    break
+                except Exception as e:
+                    retry_after = _retry_after(e)
+                    if retry_after is None or attempt == INGEST_EMBED_MAX_RETRIES:
+                        raise
+                    delay = max(retry_after, INGEST_EMBED_BACKOFF_SECONDS * 2 ** attempt) * (1 + random.random() / 4)
+                    if getattr(e, "status_code", None) == 429 or "RateLimit" in type(e).__name__:
+                        state["paused_until"] = max(state["paused_until"], time.monotonic() + delay)
+                    end = start + len(batch)
+                    logger.warning(f"⚠️  Embedding batch {start}-{end} failed ({e.__class__.__name__}); retry {attempt + 1} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+        finally:
+            semaphore.release()
+
+        store(start, np.asarray(vectors, dtype="float32"))
+        state["done"] += len(batch)
+        elapsed = time.perf_counter() - started
+        logger.info(f"🧮 Embedded {state['done']} chunks ({state['done'] / elapsed:.1f} chunks/s)")
+
+    tasks = []
+    total = 0
+    try:
+        while True:
+            await semaphore.acquire()
+            batch = await loop.run_in_executor(None, _take, source, INGEST_EMBED_BATCH_SIZE)
+            if not batch:
+                semaphore.release()
+                break
+            tasks.append(asyncio.create_task(run_batch(total, batch)))
+            total += len(batch)
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    if total == 0:
+        return np.zeros((0, 0), dtype="float32")
+    elapsed = time.perf_counter() - started
+    logger.info(f"✅ Embedded {total} chunks in {elapsed:.1f}s ({total / elapsed:.1f} chunks/s)")
+    return state["out"][:total]
@@ -0,0 +1,136 @@
+"""
+FAISS index construction and search-time tuning.
+Selects the index type from FAISS_INDEX_TYPE (Flat, IVFFlat, HNSW, IVFPQ).
+"""
+
+import math
+
+import faiss
+import numpy as np
+
+from logger import get_logger
+from config import (
+    FAISS_INDEX_TYPE,
+    FAISS_NLIST,
+    FAISS_NPROBE,
+    FAISS_HNSW_M,
+    FAISS_HNSW_EF_CONSTRUCTION,
+    FAISS_HNSW_EF_SEARCH,
+    FAISS_PQ_M,
+    FAISS_PQ_NBITS,
+)
+
+logger = get_logger(__name__)
+
+INDEX_TYPES = ("Flat", "IVFFlat", "HNSW", "IVFPQ")
+
+
+def _nlist(n_vectors: int) -> int:
+    # Rule of thumb: ~4*sqrt(N) lists, keeping >= 39 training points per list
+    if FAISS_NLIST > 0:
+        return FAISS_NLIST
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def _pq_m(dimension: int) -> int:
+    # PQ sub-quantizers must divide the vector dimension
+    m = min(FAISS_PQ_M, dimension)
+    while dimension % m:
+        m -= 1
+    return m
+
+
+def factory_string(index_type: str, dimension: int, n_vectors: int) -> str:
+    """
+    Translate an index type into a faiss.index_factory description.
+
+    Every description supports add_with_ids: IVF indexes natively, the
+    others through an IDMap wrapper.
+    """
+    if index_type == "Flat":
+        return "IDMap,Flat"
+    if index_type == "HNSW":
+        return f"IDMap,HNSW{FAISS_HNSW_M},Flat"
+    if index_type == "IVFFlat":
+        return f"IVF{_nlist(n_vectors)},Flat"
+    if index_type == "IVFPQ":
+        return f"IVF{_nlist(n_vectors)},PQ{_pq_m(dimension)}x{FAISS_PQ_NBITS}"
+    raise ValueError(f"Unknown FAISS_INDEX_TYPE '{index_type}'. Use one of: {', '.join(INDEX_TYPES)}")
+
+
+def _min_training_vectors(index_type: str, n_vectors: int) -> int:
+    if index_type == "IVFFlat":
+        return 39 * _nlist(n_vectors)
+    if index_type == "IVFPQ":
+        return max(39 * _nlist(n_vectors), 2 ** FAISS_PQ_NBITS)
+    return 0
+
+
+def build_index(vectors: np.ndarray, index_type: str = FAISS_INDEX_TYPE, metric: int = faiss.METRIC_L2):
+    """
+    Create and train an empty, id-addressable index for the given vectors.
+
+    Falls back to Flat when there are too few vectors to train the
+    requested type, which is normal for small corpora.
+    """
+    n_vectors, dimension = vectors.shape
+    if n_vectors < _min_training_vectors(index_type, n_vectors):
+        logger.warning(
+            f"⚠️  {n_vectors} vectors are too few to train {index_type}; using Flat index"
+        )
+        index_type = "Flat"
+
+    description = factory_string(index_type, dimension, n_vectors)
+    index = faiss.index_factory(dimension, description, metric)
+    if index_type == "HNSW":
+        _hnsw(index).efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+    if not index.is_trained:
+        logger.info(f"🏋️  Training {description} on {n_vectors} vectors...")
+        index.train(vectors)
+    configure_search(index)
+    return index
+
+
+def _hnsw(index):
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    return inner.hnsw if hasattr(inner, "hnsw") else None
+
+
+def configure_search(index, nprobe: int = FAISS_NPROBE, ef_search: int = FAISS_HNSW_EF_SEARCH):
+    """Apply search-time knobs (nprobe for IVF, efSearch for HNSW)."""
+    try:
+        ivf = faiss.extract_index_ivf(index)
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    except RuntimeError:
+        pass
+    hnsw = _hnsw(index)
+    if hnsw is not None:
+        hnsw.efSearch = ef_search
+    return index
+
+
+def supports_remove(index) -> bool:
+    """HNSW graphs cannot drop vectors, so updates require a rebuild."""
+    return _hnsw(index) is None
+
+
+def filtered_search_params(index, ids: np.ndarray):
+    """
+    SearchParameters restricting a search to the given ids.
+
+    Carries over the index's own nprobe/efSearch, since per-call
+    parameters replace the values set by configure_search.
+    """
+    selector = faiss.IDSelectorBatch(np.ascontiguousarray(ids, dtype="int64"))
+    hnsw = _hnsw(index)
+    try:
+        ivf = faiss.extract_index_ivf(index)
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    except RuntimeError:
+        if hnsw is not None:
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.efSearch)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+    # The SWIG wrapper does not own the selector; keep it alive with the params
+    params.selector = selector
+    return params
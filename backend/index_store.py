@@ -0,0 +1,133 @@
+"""
+On-disk layout of the FAISS knowledge index.
+
+Each ingest publishes a complete, immutable generation directory and then
+atomically repoints CURRENT at it, so readers never see a half-written index:
+
+    faiss_index/
+        CURRENT              # name of the active generation, e.g. "gen-000007"
+        gen-000007/
+            index.faiss      # IndexIDMap keyed by chunk id
+            chunks/          # memory-mapped chunk store (see chunk_store.py)
+            bm25/            # keyword index (see bm25.py)
+            manifest.json    # per-file content hashes and chunk ids
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+import faiss
+
+from logger import get_logger
+from chunk_store import ChunkStore, has_chunk_store, write_chunk_store
+
+logger = get_logger(__name__)
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+GENERATION_PREFIX = "gen-"
+KEEP_GENERATIONS = 2
+
+
+def active_generation_dir(root: str) -> Optional[str]:
+    """
+    Return the directory holding the active index, or None if there is none.
+
+    Falls back to a legacy flat layout (index.faiss directly under root).
+    """
+    current = Path(root) / CURRENT_FILE
+    if current.exists():
+        gen_dir = Path(root) / current.read_text(encoding="utf-8").strip()
+        if (gen_dir / "index.faiss").exists():
+            return str(gen_dir)
+    if (Path(root) / "index.faiss").exists():
+        return str(root)
+    return None
+
+
+def latest_version(root: str) -> int:
+    """Highest generation number present under root (0 if none)."""
+    root_path = Path(root)
+    if not root_path.exists():
+        return 0
+    versions = [
+        int(p.name[len(GENERATION_PREFIX):])
+        for p in root_path.iterdir()
+        if p.is_dir() and p.name.startswith(GENERATION_PREFIX) and p.name[len(GENERATION_PREFIX):].isdigit()
+    ]
+    return max(versions, default=0)
+
+
+def load_manifest(gen_dir: str) -> Dict:
+    path = Path(gen_dir) / MANIFEST_FILE
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def load_generation(gen_dir: str):
+    """
+    Load (index, chunks, manifest) from a generation directory.
+
+    Generations from before the chunk store (chunks.pkl) are refused rather
+    than unpickled: loading a pickle can run arbitrary code.
+    """
+    if not has_chunk_store(gen_dir):
+        raise ValueError(
+            f"{gen_dir} has no chunk store (legacy chunks.pkl format is no longer loaded). "
+            "Rebuild the index: python ingest.py --full"
+        )
+    index = faiss.read_index(os.path.join(gen_dir, "index.faiss"))
+    return index, ChunkStore(gen_dir), load_manifest(gen_dir)
+
+
+def _write_json_atomic(path: Path, data: Dict):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def publish_generation(root: str, index, chunks: Dict, manifest: Dict, bm25=None) -> str:
+    """
+    Write a new generation and atomically make it the active one.
+
+    The generation number is taken from manifest["version"].
+    """
+    root_path = Path(root)
+    root_path.mkdir(parents=True, exist_ok=True)
+    name = f"{GENERATION_PREFIX}{manifest['version']:06d}"
+    final_dir = root_path / name
+    tmp_dir = root_path / f"{name}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    shutil.rmtree(final_dir, ignore_errors=True)
+    tmp_dir.mkdir()
+
+    manifest = {**manifest, "created_at": datetime.utcnow().isoformat()}
+    faiss.write_index(index, str(tmp_dir / "index.faiss"))
+    write_chunk_store(str(tmp_dir), chunks)
+    if bm25 is not None:
+        bm25.save(str(tmp_dir))
+    _write_json_atomic(tmp_dir / MANIFEST_FILE, manifest)
+
+    os.replace(tmp_dir, final_dir)
+    tmp_current = root_path / f"{CURRENT_FILE}.tmp"
+    tmp_current.write_text(name, encoding="utf-8")
+    os.replace(tmp_current, root_path / CURRENT_FILE)
+
+    _prune_generations(root_path, keep=name)
+    return str(final_dir)
+
+
+def _prune_generations(root_path: Path, keep: str):
+    generations = sorted(
+        p for p in root_path.iterdir()
+        if p.is_dir() and p.name.startswith(GENERATION_PREFIX) and not p.name.endswith(".tmp")
+    )
+    for old in generations[:-KEEP_GENERATIONS]:
+        if old.name != keep:
+            shutil.rmtree(old, ignore_errors=True)
+            logger.debug(f"🗑️  Pruned old index generation {old.name}")
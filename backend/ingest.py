@@ -1,110 +1,282 @@
+import hashlib
 import os
-import shutil
-import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, List, NamedTuple, Optional
+
 import numpy as np
 import faiss
 from pathlib import Path
-from pydantic import SecretStr
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 from logger import get_logger
+from chunking import chunk_markdown
+from embedding_store import CachedEmbeddings
+from embeddings import aembed_in_batches, embeddings_metadata, get_embeddings
+from llm import run_sync
+from chunk_store import has_chunk_store
+from bm25 import BM25Index
+from index_factory import build_index, supports_remove
+from index_store import active_generation_dir, latest_version, load_generation, publish_generation
 from config import (
     MEDICAL_KNOWLEDGE_PATH,
     FAISS_INDEX_DIR,
-    EMBEDDINGS_MODEL,
-    OPENROUTER_API_KEY,
-    OPENROUTER_BASE_URL,
+    FAISS_INDEX_TYPE,
+    INGEST_WORKERS,
 )
 
 logger = get_logger(__name__)
 
-def load_markdown_files(data_path: str) -> list:
-    """Load all markdown files from a directory hierarchy."""
-    documents = []
-    data_dir = Path(data_path)
-    
-    if not data_dir.exists():
-        logger.warning(f"📁 Data path does not exist: {data_path}")
-        return documents
-    
-    for md_file in data_dir.rglob("*.md"):
+# Callbacks run after a successful rebuild (e.g. cache invalidation in rag.py)
+_rebuild_hooks = []
+
+
+def register_rebuild_hook(hook):
+    """Register a callable to run after the vector database is rebuilt."""
+    _rebuild_hooks.append(hook)
+
+
+def _run_rebuild_hooks():
+    for hook in _rebuild_hooks:
         try:
-            content = md_file.read_text(encoding="utf-8")
-            # Use relative path for source metadata
-            rel_path = md_file.relative_to(data_dir).as_posix()
-            doc = Document(
-                page_content=content,
-                metadata={"source": rel_path}
-            )
-            documents.append(doc)
-            logger.debug(f"✓ Loaded: {rel_path}")
+            hook()
         except Exception as e:
-            logger.warning(f"⚠️  Failed to load {md_file.name}: {e}")
-    
-    return documents
-
-def ingest_documents():
-    """Load documents, chunk, and create FAISS vector DB using OpenRouter embeddings."""
-    
-    # ✅ Delete OLD DB FIRST
-    if os.path.exists(FAISS_INDEX_DIR):
-        logger.info(f"🗑️  Deleting old vector database at {FAISS_INDEX_DIR}...")
-        shutil.rmtree(FAISS_INDEX_DIR, ignore_errors=True)
-
-    logger.info("📄 Loading markdown files...")
-    documents = load_markdown_files(MEDICAL_KNOWLEDGE_PATH)
-    
-    if not documents:
-        logger.error(f"❌ No documents found in {MEDICAL_KNOWLEDGE_PATH}")
+            logger.warning(f"⚠️  Rebuild hook {getattr(hook, '__name__', hook)} failed: {e}")
+
+class FileResult(NamedTuple):
+    source: str
+    hash: Optional[str]
+    chunks: Optional[List[Document]]  # None when the file is unchanged
+    seconds: float
+    error: Optional[str] = None
+
+
+def _process_file(task) -> FileResult:
+    """Read, hash and, if its content changed, section-chunk one markdown file (runs in a pool worker)."""
+    path, source, previous_hash = task
+    started = time.perf_counter()
+    try:
+        content = Path(path).read_text(encoding="utf-8")
+    except Exception as e:
+        return FileResult(source, None, None, time.perf_counter() - started, str(e))
+
+    digest = file_hash(content)
+    chunks = None
+    if digest != previous_hash:
+        chunks = chunk_markdown(content, source)
+    return FileResult(source, digest, chunks, time.perf_counter() - started)
+
+
+def iter_markdown_files(data_path: str, previous_files: dict, workers: int = INGEST_WORKERS) -> Iterator[FileResult]:
+    """
+    Stream per-file results for every markdown file under data_path.
+
+    Files are sharded across a process pool so reading and chunking scale
+    with cores; results are yielded in path order as workers finish them,
+    without holding every document in memory first.
+    """
+    data_dir = Path(data_path)
+    tasks = []
+    for path in sorted(data_dir.rglob("*.md")):
+        # Use relative path for source metadata
+        source = path.relative_to(data_dir).as_posix()
+        tasks.append((str(path), source, previous_files.get(source, {}).get("hash")))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) < 2:
+        yield from map(_process_file, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        yield from pool.map(_process_file, tasks, chunksize=max(1, min(64, len(tasks) // (workers * 4))))
+
+
+@contextmanager
+def _timed(timings: dict, stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+def file_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _load_previous_generation(full_rebuild: bool):
+    """Return (index, chunks, manifest) of the active generation, or Nones."""
+    if full_rebuild:
+        return None, None, None
+    gen_dir = active_generation_dir(FAISS_INDEX_DIR)
+    if gen_dir is None:
+        return None, None, None
+    # Legacy generations (pickled chunks) are never loaded, only replaced
+    if not has_chunk_store(gen_dir):
+        logger.info("ℹ️  Existing index predates the chunk store; rebuilding from scratch")
+        return None, None, None
+    index, chunks, manifest = load_generation(gen_dir)
+    # Legacy flat indexes cannot remove vectors by id
+    if not manifest:
+        logger.info("ℹ️  Existing index predates incremental ingest; rebuilding from scratch")
+        return None, None, None
+    if manifest.get("metric") != "cosine":
+        logger.info("ℹ️  Existing index uses L2 distance; rebuilding with cosine similarity")
+        return None, None, None
+    built_with = {k: manifest.get(k) for k in embeddings_metadata()}
+    if built_with != embeddings_metadata():
+        logger.info(f"ℹ️  Index was built with {built_with}; rebuilding with {embeddings_metadata()}")
+        return None, None, None
+    if manifest.get("chunking") != "sections":
+        logger.info("ℹ️  Existing index uses fixed-size chunks; rebuilding with section chunks")
+        return None, None, None
+    if manifest.get("index_type", "Flat") != FAISS_INDEX_TYPE:
+        logger.info(f"ℹ️  FAISS_INDEX_TYPE changed to {FAISS_INDEX_TYPE}; rebuilding from scratch")
+        return None, None, None
+    return index, dict(chunks.items()), manifest
+
+
+def ingest_documents(full_rebuild: bool = False):
+    """
+    Load documents, chunk, and create FAISS vector DB using the configured embeddings provider.
+
+    Incremental by default: only files whose content hash changed since the
+    active index generation are re-chunked and re-embedded, and chunks of
+    deleted files are removed. The result is published as a new generation.
+    """
+
+    if not Path(MEDICAL_KNOWLEDGE_PATH).exists():
+        logger.error(f"❌ Data path does not exist: {MEDICAL_KNOWLEDGE_PATH}")
         return
-    
-    logger.info(f"✅ Loaded {len(documents)} documents")
-
-    # ✅ Medical-optimized chunking
-    logger.info("✂️  Chunking documents...")
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=100,
-        separators=["\n## ", "\n### ", "\n- ", "\n", " "],
-    )
-    chunks = splitter.split_documents(documents)
-    logger.info(f"✅ Created {len(chunks)} chunks")
-
-    # Initialize OpenRouter embeddings (via OpenAI-compatible API)
+
+    timings = {}
+    index, chunk_map, manifest = _load_previous_generation(full_rebuild)
+    previous_files = manifest["files"] if manifest else {}
+
+    hashes = {}
+    changed = []
+    chunks = []
+
+    def stream_chunk_texts():
+        # Load/chunk stage feeding the embedding stage as results arrive
+        for result in iter_markdown_files(MEDICAL_KNOWLEDGE_PATH, previous_files):
+            timings["load+chunk (cpu)"] = timings.get("load+chunk (cpu)", 0.0) + result.seconds
+            if result.error:
+                logger.warning(f"⚠️  Failed to load {result.source}: {result.error}")
+                continue
+            hashes[result.source] = result.hash
+            if result.chunks is None:
+                continue
+            changed.append(result.source)
+            for chunk in result.chunks:
+                chunks.append(chunk)
+                yield chunk.page_content
+
+    # Initialize the configured embeddings provider
     try:
-        if not OPENROUTER_API_KEY:
-            raise ValueError("OPENROUTER_API_KEY not set in .env")
-        
-        logger.info(f"🔑 Using OpenRouter for embeddings: {EMBEDDINGS_MODEL}")
-        embeddings = OpenAIEmbeddings(
-            api_key=SecretStr(OPENROUTER_API_KEY),
-            model=EMBEDDINGS_MODEL,
-            base_url=OPENROUTER_BASE_URL
+        embeddings = get_embeddings()
+
+        logger.info("📄 Loading, chunking and embedding markdown files...")
+        with _timed(timings, "load+chunk+embed (wall)"):
+            embeddings_np = run_sync(aembed_in_batches(embeddings, stream_chunk_texts()))
+
+        if not hashes:
+            logger.error(f"❌ No documents found in {MEDICAL_KNOWLEDGE_PATH}")
+            return
+        deleted = [source for source in previous_files if source not in hashes]
+        logger.info(f"✅ Loaded {len(hashes)} documents, created {len(chunks)} chunks")
+
+        if manifest and not changed and not deleted and manifest.get("keyword_index") == "bm25":
+            logger.info(f"✅ Vector database is up to date (version {manifest['version']})")
+            return
+
+        logger.info(
+            f"🔁 {len(changed)} new/changed file(s), {len(deleted)} deleted, "
+            f"{len(hashes) - len(changed)} unchanged"
         )
 
-        logger.info("🗄️  Creating FAISS vector database...")
-        # Get embeddings for all chunks
-        texts = [doc.page_content for doc in chunks]
-        embeddings_list = embeddings.embed_documents(texts)
-        embeddings_np = np.array(embeddings_list).astype('float32')
-
-        # Create FAISS index
-        dimension = embeddings_np.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-        index.add(embeddings_np)
-
-        # ✅ Save index and chunks
-        os.makedirs(FAISS_INDEX_DIR, exist_ok=True)
-        faiss.write_index(index, os.path.join(FAISS_INDEX_DIR, "index.faiss"))
-        with open(os.path.join(FAISS_INDEX_DIR, "chunks.pkl"), "wb") as f:
-            pickle.dump(chunks, f)
-            
-        logger.info(f"✅ Vector database successfully saved to {FAISS_INDEX_DIR}")
+        replaces_existing = deleted or any(source in previous_files for source in changed)
+        if index is not None and replaces_existing and not supports_remove(index):
+            logger.info(f"ℹ️  {FAISS_INDEX_TYPE} index cannot remove vectors; rebuilding from scratch")
+            return ingest_documents(full_rebuild=True)
+
+        # Unit vectors under inner product: search scores are cosine similarities
+        if len(embeddings_np):
+            faiss.normalize_L2(embeddings_np)
+        if isinstance(embeddings, CachedEmbeddings):
+            logger.info(f"📦 Embedding cache: {embeddings.hits} reused, {embeddings.misses} embedded")
+
+        logger.info("🗄️  Updating FAISS vector database...")
+        if index is None:
+            if not chunks:
+                logger.error("❌ No chunks produced; nothing to index")
+                return
+            # Create (and train) a FAISS index addressable by chunk id
+            with _timed(timings, "index"):
+                index = build_index(embeddings_np, FAISS_INDEX_TYPE, metric=faiss.METRIC_INNER_PRODUCT)
+            chunk_map, previous_files = {}, {}
+            manifest = {"version": latest_version(FAISS_INDEX_DIR), "next_id": 0}
+
+        # Drop chunks of changed and deleted files
+        stale_ids = [
+            chunk_id
+            for source in deleted + changed
+            for chunk_id in previous_files.get(source, {}).get("ids", [])
+        ]
+        if stale_ids:
+            index.remove_ids(np.array(stale_ids, dtype="int64"))
+            for chunk_id in stale_ids:
+                chunk_map.pop(chunk_id, None)
+
+        # Add new chunks under fresh ids
+        next_id = manifest["next_id"]
+        files = {s: f for s, f in previous_files.items() if s in hashes}
+        for source in changed:
+            files[source] = {"hash": hashes[source], "ids": [], "sections": {}}
+        new_ids = []
+        for chunk in chunks:
+            chunk.metadata["chunk_id"] = next_id
+            chunk_map[next_id] = chunk
+            files[chunk.metadata["source"]]["ids"].append(next_id)
+            if "section_key" in chunk.metadata:
+                files[chunk.metadata["source"]]["sections"].setdefault(chunk.metadata["section_key"], []).append(next_id)
+            new_ids.append(next_id)
+            next_id += 1
+        if new_ids:
+            with _timed(timings, "index"):
+                index.add_with_ids(embeddings_np, np.array(new_ids, dtype="int64"))
+
+        # ✅ Publish index, chunks and manifest as a new generation
+        manifest = {
+            "version": manifest["version"] + 1,
+            "next_id": next_id,
+            **embeddings_metadata(),
+            "embedding_dim": index.d,
+            "index_type": FAISS_INDEX_TYPE,
+            "metric": "cosine",
+            "keyword_index": "bm25",
+            "chunking": "sections",
+            "files": files,
+        }
+        logger.info("🔤 Building BM25 keyword index...")
+        with _timed(timings, "bm25"):
+            bm25 = BM25Index.build({chunk_id: doc.page_content for chunk_id, doc in chunk_map.items()})
+        with _timed(timings, "publish"):
+            gen_dir = publish_generation(FAISS_INDEX_DIR, index, chunk_map, manifest, bm25=bm25)
+
+        logger.info(
+            f"✅ Vector database version {manifest['version']} saved to {gen_dir} "
+            f"({index.ntotal} chunks, {len(stale_ids)} removed, {len(new_ids)} added)"
+        )
+        logger.info("⏱️  Stage timings: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+        _run_rebuild_hooks()
 
     except Exception as e:
         logger.error(f"❌ Failed to create vector database: {e}")
         raise
 
 if __name__ == "__main__":
-    ingest_documents()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or update the FAISS knowledge index.")
+    parser.add_argument("--full", action="store_true", help="Rebuild every file instead of only changed ones")
+    args = parser.parse_args()
+    ingest_documents(full_rebuild=args.full)
@@ -0,0 +1,144 @@
+"""
+Single-pass keyword matching for severity/confidence scoring and symptom signatures.
+
+Lexicons are JSON files under LEXICON_DIR mapping group -> concept ->
+phrases (synonyms), e.g. {"severe": {"chest pain": ["chest pain",
+"chest pressure"]}}. All phrases are compiled into one regex shaped like a
+trie (shared prefixes are matched once), so a scan costs one pass over
+the text however many terms the lexicon holds.
+
+Matches respect word boundaries ("pain" does not match "painless") and
+simple negation: the first phrase within NEGATION_WINDOW words after a cue
+such as "no", "denies" or "without" is ignored ("no fever"), as are
+phrases joined to it by "or" ("denies chest pain or shortness of
+breath"). The scope ends at any other phrase, at clause punctuation, at a
+conjunction such as "and"/"but" and at a new subject, so "no appetite and
+vomiting blood", "no fever but chest pain" and "without warning I passed
+out" still find the red flag.
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+
+from config import LEXICON_DIR
+
+NEGATION_CUES = ["no", "not", "never", "without", "denies", "denied", "deny", "negative for", "free of"]
+NEGATION_WINDOW = 3  # words between the cue and the phrase
+CLAUSE_BREAKS = r"[.,;:!?|\n]|\b(?:and|plus|then|but|however|except|although|though|i|he|she|we|they)\b"
+# Carry a negation on to the next phrase of a list
+NEGATION_CONTINUES = r"\b(?:or|nor)\b"
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower().replace("’", "'")).strip()
+
+
+def _trie_regex(phrases: List[str]) -> str:
+    """Regex alternation of phrases, factored by common prefix; longest match wins."""
+    trie: dict = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        terminal = "" in node
+        branches = [
+            (r"\s+" if ch == " " else re.escape(ch)) + build(child)
+            for ch, child in sorted(node.items()) if ch
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return f"(?:{body})?"
+        return body
+
+    return build(trie)
+
+
+class Match(NamedTuple):
+    group: str
+    concept: str
+    negated: bool
+
+
+class KeywordMatcher:
+    """Finds lexicon concepts in free text in one regex pass."""
+
+    def __init__(self, lexicon: Dict[str, Dict[str, List[str]]]):
+        self._concepts = {}
+        for group, concepts in lexicon.items():
+            for concept, phrases in concepts.items():
+                for phrase in phrases:
+                    self._concepts[_normalize(phrase)] = (group, concept)
+
+        negations = _trie_regex([_normalize(cue) for cue in NEGATION_CUES])
+        terms = _trie_regex(list(self._concepts))
+        self._pattern = re.compile(
+            rf"(?P<stop>{CLAUSE_BREAKS})"
+            rf"|(?P<cont>{NEGATION_CONTINUES})"
+            rf"|(?<!\w)(?P<neg>{negations})(?!\w)"
+            rf"|(?<!\w)(?P<term>{terms})(?!\w)"
+        )
+        self._words = re.compile(r"\w+")
+
+    @classmethod
+    def from_file(cls, name: str) -> "KeywordMatcher":
+        # Lexicons ship with the code: relative paths resolve from this directory, not the CWD
+        path = Path(__file__).parent / LEXICON_DIR / name
+        return cls(json.loads(path.read_text(encoding="utf-8")))
+
+    def scan(self, text: str) -> Tuple[List[Match], List[str]]:
+        """
+        Every concept match in order of appearance, negated ones flagged,
+        plus the words of the text that no term or negation cue covered.
+        """
+        text = _normalize(text)
+        matches: List[Match] = []
+        covered = []
+        negation_end = None
+        last_negated = False
+
+        for match in self._pattern.finditer(text):
+            kind = match.lastgroup
+            if kind == "stop":
+                negation_end, last_negated = None, False
+                continue
+            if kind == "cont":
+                # "no fever or chills": the negation carries over the "or"
+                negation_end = match.end() if last_negated else None
+                continue
+            covered.append(match.span())
+            if kind == "neg":
+                negation_end = match.end()
+                continue
+            group, concept = self._concepts[_normalize(match.group("term"))]
+            negated = (
+                negation_end is not None
+                and len(self._words.findall(text, negation_end, match.start())) <= NEGATION_WINDOW
+            )
+            # A cue negates only the phrase right after it (and what "or" joins to it)
+            negation_end, last_negated = None, negated
+            matches.append(Match(group, concept, negated))
+
+        rest, position = [], 0
+        for start, end in covered:
+            rest.append(text[position:start])
+            position = end
+        rest.append(text[position:])
+        return matches, self._words.findall(" ".join(rest))
+
+    def find(self, text: str) -> Dict[str, List[str]]:
+        """Return {group: [concept, ...]} for non-negated matches, in order of first appearance."""
+        found: Dict[str, List[str]] = {}
+        for match in self.scan(text)[0]:
+            if match.negated:
+                continue
+            concepts = found.setdefault(match.group, [])
+            if match.concept not in concepts:
+                concepts.append(match.concept)
+        return found
@@ -1,3 +1,6 @@
+import asyncio
+import threading
+from typing import Optional
 from langchain_openai import ChatOpenAI
 from logger import get_logger
 from config import (
@@ -23,7 +26,8 @@ try:
         base_url=OPENROUTER_BASE_URL,
         temperature=LLM_TEMPERATURE,
         max_tokens=LLM_MAX_TOKENS,
-        timeout=60
+        timeout=60,
+        stream_usage=True  # Token counts on streamed responses too (see metrics)
     )
     logger.info(f"✅ LLM initialized with OpenRouter: {LLM_MODEL}")
 except Exception as e:
@@ -38,3 +42,29 @@ def get_llm():
             "LLM not initialized. Check OPENROUTER_API_KEY in .env is set correctly."
         )
     return llm
+
+
+# ============= SYNC BRIDGE =============
+# The async LangChain clients keep their HTTP connection pools bound to the
+# event loop that first used them, so sync callers share one long-lived loop
+# instead of spinning up a fresh one with asyncio.run() on every call.
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_loop_lock = threading.Lock()
+
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None or _sync_loop.is_closed():
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_sync_loop.run_forever,
+                name="carenova-sync-loop",
+                daemon=True
+            ).start()
+        return _sync_loop
+
+
+def run_sync(coro):
+    """Run a coroutine to completion from synchronous code (CLI, Streamlit)."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_sync_loop()).result()
@@ -1,22 +1,38 @@
 """
 Structured logging configuration.
 All logs go to both console and file.
+
+Loggers only put records on a bounded in-memory queue; a single
+background listener formats them and writes console and file output,
+flushing once per batch. Request handling never waits on disk I/O: when
+the queue is full, records are dropped and counted, and high-volume
+DEBUG/INFO call sites are sampled once they exceed their burst allowance.
+WARNING and above are never sampled.
 """
 
+import atexit
+import copy
 import logging
 import logging.handlers
+import queue
+import random
+import threading
 from pathlib import Path
 import json
 from datetime import datetime
-from config import LOG_LEVEL, DEBUG
+from config import LOG_LEVEL, DEBUG, LOG_QUEUE_SIZE, LOG_BATCH_SIZE, LOG_SAMPLE_BURST, LOG_SAMPLE_RATE
+from tracing import current_ids
+
+# Seconds over which each call site gets LOG_SAMPLE_BURST unsampled records
+SAMPLE_WINDOW_SECONDS = 60.0
 
 
 class JSONFormatter(logging.Formatter):
     """Convert logs to JSON for easier parsing."""
-    
+
     def format(self, record):
         log_obj = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcfromtimestamp(record.created).isoformat(),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -24,47 +40,199 @@ class JSONFormatter(logging.Formatter):
             "function": record.funcName,
             "line": record.lineno,
         }
+        # Correlate with the request's trace (captured when the record was queued, see tracing.py)
+        if getattr(record, "trace_id", None):
+            log_obj["trace_id"] = record.trace_id
+            log_obj["span_id"] = record.span_id
+            log_obj["request_id"] = record.request_id
         if record.exc_info:
             log_obj["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            log_obj["exception"] = record.exc_text
         return json.dumps(log_obj)
 
 
+class _BatchFlushMixin:
+    """Handler whose per-record flush is deferred to the end of the listener's batch."""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        try:
+            super().flush()
+        except (OSError, ValueError):
+            # Stream closed underneath the writer, e.g. by the interpreter or a test runner at exit
+            pass
+
+
+class _BatchStreamHandler(_BatchFlushMixin, logging.StreamHandler):
+    pass
+
+
+class _BatchRotatingFileHandler(_BatchFlushMixin, logging.handlers.RotatingFileHandler):
+    pass
+
+
+class _SampledQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue without blocking: sample busy DEBUG/INFO call sites, drop and count when full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        # (path, line) -> [window start, records in window]; updated without a lock, so counts are approximate
+        self._sites = {}
+        self.dropped = 0
+        self.sampled_out = 0
+
+    def _sampled(self, record) -> bool:
+        if record.levelno >= logging.WARNING or LOG_SAMPLE_BURST <= 0:
+            return True
+        site = self._sites.get((record.pathname, record.lineno))
+        if site is None or record.created - site[0] >= SAMPLE_WINDOW_SECONDS:
+            self._sites[(record.pathname, record.lineno)] = [record.created, 1]
+            return True
+        site[1] += 1
+        return site[1] <= LOG_SAMPLE_BURST or random.random() < LOG_SAMPLE_RATE
+
+    def handle(self, record):
+        if not self._sampled(record):
+            self.sampled_out += 1
+            return False
+        return super().handle(record)
+
+    def prepare(self, record):
+        # Resolve everything that depends on the calling thread before handing off
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        ids = current_ids()
+        if ids:
+            record.trace_id, record.span_id, record.request_id = ids
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _BatchQueueListener(logging.handlers.QueueListener):
+    """Single writer handling up to LOG_BATCH_SIZE records per handler flush."""
+
+    def __init__(self, log_queue: queue.Queue, *handlers, source: _SampledQueueHandler):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self._source = source
+        self._reported_drops = 0
+
+    def enqueue_sentinel(self):
+        # Blocking put: the sentinel must get through even when the queue is full
+        self.queue.put(self._sentinel)
+
+    def _monitor(self):
+        log_queue = self.queue
+        stopping = False
+        while not stopping:
+            batch = [log_queue.get()]
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    batch.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is self._sentinel:
+                    stopping = True
+                else:
+                    self.handle(record)
+                log_queue.task_done()
+            self._report_drops()
+            for handler in self.handlers:
+                handler.flush_batch()
+
+    def _report_drops(self):
+        dropped = self._source.dropped
+        if dropped > self._reported_drops:
+            record = logging.LogRecord(
+                __name__, logging.WARNING, __file__, 0,
+                f"⚠️  Log queue full, dropped {dropped - self._reported_drops} records", None, None
+            )
+            self._reported_drops = dropped
+            self.handle(record)
+
+
+_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_queue_handler = _SampledQueueHandler(_queue)
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _start_listener():
+    """Create the console and file handlers and the one listener writing to them."""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return
+
+        # Console handler (human-readable)
+        console_handler = _BatchStreamHandler()
+        console_handler.setLevel(LOG_LEVEL)
+        console_formatter = logging.Formatter(
+            "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        )
+        console_handler.setFormatter(console_formatter)
+
+        # File handler (JSON format for parsing)
+        logs_path = Path("logs")
+        logs_path.mkdir(exist_ok=True)
+
+        file_handler = _BatchRotatingFileHandler(
+            logs_path / "carenova.log",
+            maxBytes=10 * 1024 * 1024,  # 10 MB
+            backupCount=5
+        )
+        file_handler.setLevel(LOG_LEVEL)
+        file_handler.setFormatter(JSONFormatter())
+
+        _listener = _BatchQueueListener(_queue, console_handler, file_handler, source=_queue_handler)
+        _listener.start()
+        atexit.register(_stop_listener)
+
+
+def _stop_listener():
+    """Write out everything still queued (runs at interpreter exit)."""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
 def get_logger(name: str) -> logging.Logger:
-    """Get or create a logger with file and console output."""
+    """Get or create a logger feeding the shared background writer."""
     logger = logging.getLogger(name)
-    
+
     # Skip if already configured
     if logger.handlers:
         return logger
-    
+
     logger.setLevel(LOG_LEVEL)
-    
-    # Console handler (human-readable)
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(LOG_LEVEL)
-    console_formatter = logging.Formatter(
-        "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
-    console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
-    
-    # File handler (JSON format for parsing)
-    logs_path = Path("logs")
-    logs_path.mkdir(exist_ok=True)
-    
-    file_handler = logging.handlers.RotatingFileHandler(
-        logs_path / "carenova.log",
-        maxBytes=10 * 1024 * 1024,  # 10 MB
-        backupCount=5
-    )
-    file_handler.setLevel(LOG_LEVEL)
-    file_handler.setFormatter(JSONFormatter())
-    logger.addHandler(file_handler)
-    
+    _start_listener()
+    logger.addHandler(_queue_handler)
+
     return logger
 
 
+def get_logging_stats() -> dict:
+    """Queue depth and records dropped (queue full) or sampled out since startup."""
+    return {
+        "queued": _queue.qsize(),
+        "max_queue": LOG_QUEUE_SIZE,
+        "dropped": _queue_handler.dropped,
+        "sampled_out": _queue_handler.sampled_out,
+    }
+
+
 # Main logger
 logger = get_logger("carenova")
 
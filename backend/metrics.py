@@ -0,0 +1,189 @@
+"""
+Prometheus-style metrics without extra dependencies.
+
+Counters and histograms live in process memory and are rendered in the
+Prometheus text exposition format by render() (served at GET /metrics).
+Values that already live elsewhere (cache and admission counters) are
+read at scrape time through register_collector().
+
+Stages are timed with the timed() context manager:
+
+    with timed("embed"):
+        query_emb = await current.aembed(query)
+
+Each timed stage is also a tracing span of the same name (tracing.py).
+With METRICS_ENABLED and TRACING_ENABLED off, timed() hands back a shared
+no-op context and nothing is recorded.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import METRICS_ENABLED, TRACING_ENABLED
+from tracing import span
+
+# Seconds; spans a cache hit (sub-millisecond) to a slow LLM call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_metrics: List["_Metric"] = []
+_collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]] = []
+_NOOP = nullcontext()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        lines = self._header()
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.labels, key)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> (per-bucket counts, +Inf count, sum)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = {key: (list(counts), total, amount) for key, (counts, total, amount) in self._values.items()}
+        lines = self._header()
+        for key, (counts, total, amount) in sorted(values.items()):
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': repr(bound)})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {total}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(amount)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {total}")
+        return lines
+
+
+@contextmanager
+def _timer(histogram: Histogram, labels: Dict[str, str], span_name: str):
+    started = time.perf_counter()
+    try:
+        with span(span_name):
+            yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+def register_collector(collector: Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]):
+    """
+    Add a scrape-time source of metrics. collector() returns
+    (name, type, help, [(labels, value), ...]) tuples.
+    """
+    _collectors.append(collector)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        for name, kind, help_text, samples in collector():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+# ============= APPLICATION METRICS =============
+
+HTTP_REQUESTS = Counter("carenova_http_requests_total", "HTTP requests by route and status.", ("method", "path", "status"))
+HTTP_SECONDS = Histogram("carenova_http_request_seconds", "HTTP request latency by route.", ("path",))
+WEBSOCKET_SESSIONS = Counter("carenova_websocket_sessions_total", "WebSocket chat sessions by outcome.", ("outcome",))
+STAGE_SECONDS = Histogram(
+    "carenova_stage_seconds",
+    "Latency of analysis pipeline stages (score, triage, embed, search, prompt, llm, parse, followup).",
+    ("stage",),
+)
+ERRORS = Counter("carenova_errors_total", "Errors handled with a fallback answer, by stage.", ("stage",))
+LLM_TOKENS = Counter("carenova_llm_tokens_total", "LLM tokens reported by the provider.", ("call", "kind"))
+ADMISSION_WAIT_SECONDS = Histogram("carenova_admission_wait_seconds", "Time admitted requests waited for an analysis slot.")
+
+
+def timed(stage: str):
+    """Context manager recording the duration of a pipeline stage, and a span for it."""
+    if not METRICS_ENABLED and not TRACING_ENABLED:
+        return _NOOP
+    return _timer(STAGE_SECONDS, {"stage": stage}, stage)
+
+
+def record_tokens(call: str, message) -> None:
+    """Count input/output tokens from a LangChain message's usage metadata, when present."""
+    usage: Optional[dict] = getattr(message, "usage_metadata", None)
+    if not METRICS_ENABLED or not usage:
+        return
+    LLM_TOKENS.inc(usage.get("input_tokens", 0), call=call, kind="input")
+    LLM_TOKENS.inc(usage.get("output_tokens", 0), call=call, kind="output")
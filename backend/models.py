@@ -22,11 +22,13 @@ class SymptomRequest(BaseModel):
 class FollowupQuestionsRequest(BaseModel):
     """Input: Generate adaptive follow-up questions"""
     symptoms: str = Field(..., min_length=5, max_length=1000, description="User's symptom description")
+    session_id: Optional[str] = Field(None, max_length=100, description="Conversation id; lets /analyze reuse this step's retrieval")
     
     class Config:
         json_schema_extra = {
             "example": {
-                "symptoms": "I have a persistent cough and chest pain"
+                "symptoms": "I have a persistent cough and chest pain",
+                "session_id": "user123"
             }
         }
 
@@ -51,11 +53,13 @@ class AnalysisRequest(BaseModel):
     """Input: Analyze symptoms + answers"""
     initial_symptoms: str = Field(..., min_length=5, max_length=1000)
     followup_answers: List[str] = Field(default_factory=list, max_length=10)
+    session_id: Optional[str] = Field(None, max_length=100, description="Conversation id used for /followup-questions")
     
     class Config:
         json_schema_extra = {
             "example": {
                 "initial_symptoms": "I have a persistent cough and chest pain",
+                "session_id": "user123",
                 "followup_answers": [
                     "For 2 weeks",
                     "It comes and goes",
@@ -0,0 +1,255 @@
+"""
+Follow-up question cache keyed on a normalized symptom signature.
+
+Initial complaints cluster heavily (fever + headache, cough + chest pain,
+...), so follow-up questions are cached per signature: the sorted symptom
+concepts the symptoms lexicon finds in the text, negated ones as
+"no <concept>". "Headaches and feeling feverish" and "fever, headache"
+share the signature "fever+headache". Texts with more than
+FOLLOWUP_CACHE_MAX_UNMATCHED_WORDS words the lexicon does not cover are
+not cached, so details a signature would drop still reach the LLM.
+
+Answers generated at runtime live in an LRU/TTL cache. Running
+
+    python question_cache.py
+
+precomputes questions for the symptom clusters in the knowledge base's
+Common Symptoms sections into FOLLOWUP_CACHE_PATH, which is loaded at
+startup and never evicted.
+
+Questions are grounded in the index's differential, so when the server
+hot-reloads a new index generation the runtime cache is cleared and the
+precomputed file is ignored unless it was generated for that version.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from bm25 import STOPWORDS
+from cache import TTLCache
+from chunking import parse_sections, section_key
+from keyword_matcher import KeywordMatcher
+from logger import get_logger
+from rag import aretrieve, index_version, register_reload_listener
+from config import (
+    FOLLOWUP_CACHE_ENABLED,
+    FOLLOWUP_CACHE_MAX_ENTRIES,
+    FOLLOWUP_CACHE_MAX_UNMATCHED_WORDS,
+    FOLLOWUP_CACHE_PATH,
+    FOLLOWUP_CACHE_TTL_SECONDS,
+    MEDICAL_KNOWLEDGE_PATH,
+)
+
+logger = get_logger(__name__)
+
+SYMPTOM_MATCHER = KeywordMatcher.from_file("symptoms.json")
+CLUSTER_SECTION = "common_symptoms"
+
+# Words that do not change which questions are worth asking
+FILLER_WORDS = frozenset(
+    "also really very bit little lot some since about feel feeling felt having had got getting "
+    "just keep kept started start today yesterday morning evening night now recently "
+    "hour hours day days week weeks month months couple few past last".split()
+)
+
+_runtime_cache = TTLCache(
+    max_entries=FOLLOWUP_CACHE_MAX_ENTRIES,
+    max_bytes=0,
+    ttl_seconds=FOLLOWUP_CACHE_TTL_SECONDS,
+)
+_precomputed: Dict[str, List[str]] = {}
+_precomputed_lock = threading.Lock()
+_stats = {"precomputed_hits": 0, "uncacheable": 0}
+
+
+def _signature(present, absent=()) -> Optional[str]:
+    return "+".join(sorted(present) + [f"no {concept}" for concept in sorted(absent)]) or None
+
+
+def symptom_signature(symptom_text: str) -> Optional[str]:
+    """
+    Canonical signature of the symptoms in a text, or None when the text
+    names no known symptom or says too much the lexicon cannot capture.
+    """
+    matches, unmatched = SYMPTOM_MATCHER.scan(symptom_text)
+    extra = [w for w in unmatched if w not in STOPWORDS and w not in FILLER_WORDS and not w.isdigit()]
+    if not matches or len(extra) > FOLLOWUP_CACHE_MAX_UNMATCHED_WORDS:
+        return None
+
+    present = {m.concept for m in matches if not m.negated}
+    absent = {m.concept for m in matches if m.negated} - present
+    return _signature(present, absent)
+
+
+def _load_precomputed(path: str = FOLLOWUP_CACHE_PATH) -> Tuple[Dict[str, List[str]], Optional[int]]:
+    """(questions by signature, index version they were generated for)."""
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        questions = {signature: list(questions) for signature, questions in data["questions"].items()}
+        return questions, data.get("index_version")
+    except FileNotFoundError:
+        return {}, None
+    except Exception as e:
+        logger.warning(f"⚠️  Could not load precomputed follow-up questions from {path}: {e}")
+        return {}, None
+
+
+def reload_precomputed(version: Optional[int] = None):
+    """(Re)load the warm-up file written by `python question_cache.py`, if it matches index version."""
+    global _precomputed
+    loaded, generated_for = _load_precomputed()
+    if loaded and generated_for != version:
+        logger.warning(
+            f"⚠️  Precomputed follow-up questions are for index version {generated_for}, not {version}; "
+            "ignoring them. Run: python question_cache.py"
+        )
+        loaded = {}
+    with _precomputed_lock:
+        _precomputed = loaded
+    if loaded:
+        logger.info(f"📦 Loaded {len(loaded)} precomputed follow-up question sets")
+
+
+def get_cached_questions(symptom_text: str) -> Optional[List[str]]:
+    """Cached follow-up questions for the text's symptom signature, if any."""
+    if not FOLLOWUP_CACHE_ENABLED:
+        return None
+    signature = symptom_signature(symptom_text)
+    if signature is None:
+        _stats["uncacheable"] += 1
+        return None
+
+    questions = _precomputed.get(signature)
+    if questions is not None:
+        _stats["precomputed_hits"] += 1
+    else:
+        questions = _runtime_cache.get(signature)
+    if questions is not None:
+        logger.info(f"⚡ Follow-up cache hit: {signature}")
+        return list(questions)
+    return None
+
+
+def cache_questions(symptom_text: str, questions: List[str]):
+    """Remember freshly generated questions under the text's symptom signature."""
+    if not FOLLOWUP_CACHE_ENABLED:
+        return
+    signature = symptom_signature(symptom_text)
+    if signature is not None:
+        _runtime_cache.set(signature, list(questions))
+
+
+def get_question_cache_stats() -> dict:
+    """Runtime cache counters plus precomputed-set usage."""
+    return {
+        "enabled": FOLLOWUP_CACHE_ENABLED,
+        **_runtime_cache.stats(),
+        "precomputed_entries": len(_precomputed),
+        **_stats,
+    }
+
+
+def invalidate_question_cache():
+    """Drop runtime entries; they were grounded in the previous knowledge index."""
+    _runtime_cache.clear()
+
+
+def on_index_reload(version: Optional[int]):
+    """The server swapped index generations: forget questions grounded in the old one."""
+    invalidate_question_cache()
+    reload_precomputed(version)
+    logger.info("🧹 Follow-up question cache invalidated")
+
+
+register_reload_listener(on_index_reload)
+reload_precomputed(index_version())
+
+
+# ============= WARM-UP =============
+
+def symptom_clusters(max_size: int = 2, data_path: str = MEDICAL_KNOWLEDGE_PATH) -> List[Tuple[str, ...]]:
+    """
+    Symptom combinations worth precomputing: every single symptom and every
+    combination of up to max_size symptoms listed together under one
+    disease's Common Symptoms.
+    """
+    clusters = set()
+    for path in sorted(Path(data_path).rglob("*.md")):
+        _, sections = parse_sections(path.read_text(encoding="utf-8"))
+        for heading, body in sections:
+            if section_key(heading) != CLUSTER_SECTION:
+                continue
+            concepts = sorted(SYMPTOM_MATCHER.find(body).get("symptom", []))
+            for size in range(1, max_size + 1):
+                clusters.update(itertools.combinations(concepts, size))
+    return sorted(clusters)
+
+
+async def warm_up(max_size: int = 2, concurrency: int = 4, full: bool = False) -> Dict[str, List[str]]:
+    """Generate questions for every symptom cluster missing from the precomputed file."""
+    # Imported here: adaptive_questions depends on this module for its cache
+    from adaptive_questions import aask_followup_questions
+
+    entries, generated_for = _load_precomputed()
+    if full or generated_for != index_version():
+        entries = {}
+    pending = {}
+    for cluster in symptom_clusters(max_size):
+        signature = _signature(cluster)
+        if signature not in entries:
+            pending[signature] = ", ".join(cluster)
+    logger.info(f"🔥 Warming {len(pending)} symptom clusters ({len(entries)} already precomputed)")
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started = time.perf_counter()
+    failed = 0
+
+    async def generate(signature: str, text: str):
+        nonlocal failed
+        async with semaphore:
+            questions = await aask_followup_questions(text, await aretrieve(text))
+        if questions is None:
+            failed += 1
+        else:
+            entries[signature] = questions
+
+    await asyncio.gather(*(generate(signature, text) for signature, text in pending.items()))
+    logger.info(
+        f"✅ Precomputed {len(pending) - failed}/{len(pending)} clusters "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    return entries
+
+
+def save_precomputed(entries: Dict[str, List[str]], path: str = FOLLOWUP_CACHE_PATH):
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        "created_at": datetime.now().isoformat(),
+        "index_version": index_version(),
+        "questions": dict(sorted(entries.items())),
+    }
+    tmp = target.with_suffix(target.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(tmp, target)
+    logger.info(f"💾 Saved {len(entries)} follow-up question sets to {path}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from llm import run_sync
+
+    parser = argparse.ArgumentParser(description="Precompute follow-up questions for common symptom clusters.")
+    parser.add_argument("--max-size", type=int, default=2, help="Largest symptom combination to precompute")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent LLM calls")
+    parser.add_argument("--full", action="store_true", help="Regenerate every cluster instead of only missing ones")
+    args = parser.parse_args()
+    save_precomputed(run_sync(warm_up(args.max_size, args.concurrency, args.full)))
@@ -1,65 +1,390 @@
+import asyncio
 import json
-import os
-import pickle
+import threading
+from datetime import datetime
 import numpy as np
+from typing import AsyncIterator, List, NamedTuple, Optional, Tuple
 import faiss
-from langchain_openai import OpenAIEmbeddings
-from pydantic import SecretStr
-from llm import get_llm
+from langchain_core.documents import Document
+from llm import get_llm, run_sync
 from logger import get_logger
+from embeddings import embeddings_metadata, get_embeddings
+from streaming import IncrementalJSONParser
+from cache import TTLCache, normalize_query
+from semantic_cache import SemanticCache
+from singleflight import SingleFlight
+from admission import Overloaded, iterate_with_deadline, reclaim_slot, wait_without_slot, with_deadline
+from metrics import ERRORS, record_tokens, timed
+from tracing import current_span, traced
+from ingest import register_rebuild_hook
+from index_store import active_generation_dir, load_generation
+from index_factory import configure_search, filtered_search_params
+from bm25 import BM25Index, has_bm25, reciprocal_rank_fusion
+from chunking import body_system
+from router import PROFILE_SECTIONS, PartitionRouter
 from config import (
     FAISS_INDEX_DIR,
-    EMBEDDINGS_MODEL,
     RAG_SCORE_THRESHOLD,
     RAG_K_RESULTS,
+    RAG_CONTEXT_SECTIONS,
+    RAG_HYBRID_ENABLED,
+    RAG_HYBRID_CANDIDATES,
+    RAG_RRF_K,
+    RAG_ROUTER_ENABLED,
+    RAG_ROUTER_MAX_PARTITIONS,
+    RAG_ROUTER_MIN_SHARE,
     RAG_CACHE_ENABLED,
-    OPENROUTER_API_KEY,
-    OPENROUTER_BASE_URL
+    RAG_CACHE_MAX_ENTRIES,
+    RAG_CACHE_MAX_BYTES,
+    RAG_CACHE_TTL_SECONDS,
+    RAG_SEMANTIC_CACHE_ENABLED,
+    RAG_SEMANTIC_CACHE_MAX_DISTANCE,
+    RAG_SEMANTIC_CACHE_MAX_ENTRIES,
+    RAG_SEMANTIC_CACHE_TTL_SECONDS,
+    RAG_SINGLE_FLIGHT_ENABLED,
 )
 
 logger = get_logger(__name__)
 
-# Simple in-memory cache for RAG responses
-_rag_cache = {}
+# Bounded in-memory cache for RAG responses, keyed on the normalized query
+_rag_cache = TTLCache(
+    max_entries=RAG_CACHE_MAX_ENTRIES,
+    max_bytes=RAG_CACHE_MAX_BYTES,
+    ttl_seconds=RAG_CACHE_TTL_SECONDS
+)
+
+# Answers for paraphrased queries, keyed on the query embedding
+_semantic_cache = SemanticCache(
+    max_distance=RAG_SEMANTIC_CACHE_MAX_DISTANCE,
+    max_entries=RAG_SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl_seconds=RAG_SEMANTIC_CACHE_TTL_SECONDS
+)
+
+# Concurrent identical queries share one in-flight answer, keyed like _rag_cache
+_single_flight = SingleFlight()
+
+
+def get_cache_stats() -> dict:
+    """Hit/miss/eviction counters for the RAG response caches."""
+    return {
+        "enabled": RAG_CACHE_ENABLED,
+        **_rag_cache.stats(),
+        "semantic": {"enabled": RAG_SEMANTIC_CACHE_ENABLED, **_semantic_cache.stats()},
+        "single_flight": {"enabled": RAG_SINGLE_FLIGHT_ENABLED, **_single_flight.stats()},
+    }
+
+
+def invalidate_caches():
+    """Drop cached answers; they were grounded in the previous knowledge index."""
+    _rag_cache.clear()
+    _semantic_cache.clear()
+    logger.info("🧹 RAG caches invalidated")
+
+
+register_rebuild_hook(invalidate_caches)
+
+# Running totals of retrieval scores, reported with the index info
+_retrieval_stats = {"queries": 0, "kept": 0, "dropped": 0, "top_score_sum": 0.0}
+
+
+def _record_retrieval(hits: list, dropped: int):
+    _retrieval_stats["queries"] += 1
+    _retrieval_stats["kept"] += len(hits)
+    _retrieval_stats["dropped"] += dropped
+    if hits:
+        _retrieval_stats["top_score_sum"] += hits[0][1]
+
+
+def get_retrieval_stats() -> dict:
+    queries = _retrieval_stats["queries"]
+    return {
+        "score_threshold": RAG_SCORE_THRESHOLD,
+        "queries": queries,
+        "hits_kept": _retrieval_stats["kept"],
+        "hits_dropped": _retrieval_stats["dropped"],
+        "avg_top_score": round(_retrieval_stats["top_score_sum"] / queries, 4) if queries else None,
+    }
+
+
+FILTER_FIELDS = ("body_system", "source", "section_key")
+
+
+def validate_filters(filters: Optional[dict]):
+    """Reject unknown metadata fields; values are a string or a list of strings."""
+    unknown = set(filters or {}) - set(FILTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown filter field(s) {sorted(unknown)}. Use: {', '.join(FILTER_FIELDS)}")
+
 
 class SimpleRetriever:
     def __init__(self, index_dir, embeddings):
-        self.index = faiss.read_index(os.path.join(index_dir, "index.faiss"))
-        with open(os.path.join(index_dir, "chunks.pkl"), "rb") as f:
-            self.chunks = pickle.load(f)
+        # chunks is a memory-mapped ChunkStore; Documents are only built for search hits
+        self.index_dir = index_dir
+        self.index, self.chunks, self.manifest = load_generation(index_dir)
+        configure_search(self.index)
+        self.bm25 = BM25Index.load(index_dir) if has_bm25(index_dir) else None
+        self._check_embeddings_match()
+        self._build_partitions()
         self.embeddings = embeddings
+        self.loaded_at = datetime.utcnow().isoformat()
 
-    def invoke(self, query: str):
-        query_emb = np.array([self.embeddings.embed_query(query)]).astype('float32')
-        # We'll use IndexFlatL2 distance (lower is better)
-        # To simulate a threshold, we'd need to convert distance to score
-        distances, indices = self.index.search(query_emb, RAG_K_RESULTS)
-        
+    def _build_partitions(self):
+        # Chunk ids per body system, plus a keyword router over their profile sections
+        files = self.manifest.get("files", {})
+        partitions, profiles = {}, {}
+        for source, entry in files.items():
+            system = body_system(source)
+            partitions.setdefault(system, []).extend(entry["ids"])
+            sections = entry.get("sections", {})
+            profiles.setdefault(system, []).extend(
+                self.chunks[i].page_content for key in PROFILE_SECTIONS for i in sections.get(key, [])
+            )
+        self.partitions = {name: np.array(sorted(ids), dtype="int64") for name, ids in partitions.items()}
+        self.router = PartitionRouter(profiles) if len(profiles) > 1 else None
+        self._restrictions = {}
+        self._preferred = {}
+
+    def route(self, query: str) -> Optional[frozenset]:
+        """
+        Chunk ids of the body systems the router picks, to be boosted in fuse(), or None.
+
+        Routing never restricts the search: symptoms often span systems
+        (chest pain is cardiac and respiratory), so routed chunks only get
+        an extra vote in the ranking.
+        """
+        if self.router is None or not RAG_ROUTER_ENABLED:
+            return None
+        systems = self.router.route(query, RAG_ROUTER_MAX_PARTITIONS, RAG_ROUTER_MIN_SHARE)
+        if not systems:
+            return None
+        logger.debug(f"🧭 Routed query to {', '.join(systems)}")
+        key = tuple(sorted(systems))
+        preferred = self._preferred.get(key)
+        if preferred is None:
+            preferred = self._preferred[key] = frozenset(
+                int(i) for system in key for i in self.partitions.get(system, [])
+            )
+        return preferred
+
+    def filter_ids(self, filters: dict) -> np.ndarray:
+        """Sorted chunk ids matching every filter (values within one field are OR-ed)."""
+        validate_filters(filters)
+        files = self.manifest.get("files", {})
+        allowed = None
+        for field, values in filters.items():
+            values = [values] if isinstance(values, str) else list(values)
+            if field == "body_system":
+                ids = [self.partitions.get(v, []) for v in values]
+            elif field == "source":
+                ids = [files.get(v, {}).get("ids", []) for v in values]
+            else:
+                ids = [entry.get("sections", {}).get(v, []) for entry in files.values() for v in values]
+            ids = np.unique(np.concatenate([np.asarray(i, dtype="int64") for i in ids] or [np.zeros(0, "int64")]))
+            allowed = ids if allowed is None else np.intersect1d(allowed, ids)
+        return allowed if allowed is not None else np.zeros(0, dtype="int64")
+
+    def _restriction(self, filters: dict):
+        # (allowed ids, FAISS search params) per distinct filter set, built once
+        key = json.dumps(filters, sort_keys=True)
+        restriction = self._restrictions.get(key)
+        if restriction is None:
+            ids = self.filter_ids(filters)
+            restriction = (ids, filtered_search_params(self.index, ids) if len(ids) else None)
+            if len(self._restrictions) >= 256:
+                self._restrictions.clear()
+            self._restrictions[key] = restriction
+        return restriction
+
+    def _check_embeddings_match(self):
+        # Query vectors must come from the provider that built the index
+        built_with = {k: self.manifest[k] for k in embeddings_metadata() if k in self.manifest}
+        if built_with and built_with != {k: embeddings_metadata()[k] for k in built_with}:
+            raise ValueError(
+                f"Index {self.index_dir} was built with {built_with}, but {embeddings_metadata()} "
+                "is configured. Run: python ingest.py --full"
+            )
+
+    @property
+    def version(self):
+        return self.manifest.get("version")
+
+    def embed(self, query: str) -> np.ndarray:
+        return np.array([self.embeddings.embed_query(query)]).astype('float32')
+
+    async def aembed(self, query: str) -> np.ndarray:
+        return np.array([await self.embeddings.aembed_query(query)]).astype('float32')
+
+    def dense_search(self, query_emb, k: int, filters: Optional[dict] = None) -> List[Tuple[int, float]]:
+        """
+        Return (chunk_id, cosine score) pairs at or above RAG_SCORE_THRESHOLD.
+
+        With filters, only chunks matching them are searched (FAISS ID
+        selector), so distance work scales with the selected partition.
+
+        Indexes built by ingest hold L2-normalized vectors under inner
+        product, so the raw score is the cosine similarity. Legacy L2
+        indexes report squared distance, which for unit vectors converts
+        to cosine as 1 - d/2.
+        """
+        params = None
+        if filters:
+            ids, params = self._restriction(filters)
+            if not len(ids):
+                return []
+
+        hits = []
+        dropped = 0
+        for i, score in self._cosine_search(query_emb, k, params):
+            if score < RAG_SCORE_THRESHOLD:
+                dropped += 1
+                continue
+            hits.append((i, score))
+
+        _record_retrieval(hits, dropped)
+        return hits
+
+    def _cosine_search(self, query_emb, k: int, params=None) -> List[Tuple[int, float]]:
+        query_emb = np.array(query_emb, dtype="float32")
+        faiss.normalize_L2(query_emb)
+        raw_scores, indices = self.index.search(query_emb, k, params=params)
+        metric_ip = self.index.metric_type == faiss.METRIC_INNER_PRODUCT
+        return [
+            (int(i), float(raw) if metric_ip else 1.0 - float(raw) / 2)
+            for i, raw in zip(indices[0], raw_scores[0]) if i != -1
+        ]
+
+    def vet_keyword_hits(self, query_emb, dense, keyword_hits) -> Optional[List[Tuple[int, float]]]:
+        """
+        keyword_hits that pass RAG_SCORE_THRESHOLD, as (chunk_id, cosine).
+
+        BM25 hits already among the dense candidates keep their score; the
+        rest are scored by a FAISS search restricted to their ids, and any
+        the index does not return (approximate indexes) are dropped.
+        """
+        if not keyword_hits:
+            return keyword_hits
+        cosine = dict(dense)
+        missing = [i for i, _ in keyword_hits if i not in cosine]
+        if missing:
+            params = filtered_search_params(self.index, np.array(missing, dtype="int64"))
+            cosine.update(self._cosine_search(query_emb, len(missing), params))
+        vetted = [(i, cosine[i]) for i, _ in keyword_hits if cosine.get(i, -1.0) >= RAG_SCORE_THRESHOLD]
+        _retrieval_stats["dropped"] += len(keyword_hits) - len(vetted)
+        return vetted
+
+    def keyword_search(self, query: str, filters: Optional[dict] = None) -> Optional[List[Tuple[int, float]]]:
+        """BM25 (chunk_id, score) candidates, or None when hybrid retrieval is off."""
+        if self.bm25 is None or not RAG_HYBRID_ENABLED:
+            return None
+        allowed = self._restriction(filters)[0] if filters else None
+        return self.bm25.search(query, RAG_HYBRID_CANDIDATES, allowed)
+
+    def search(self, query_emb, keyword_hits=None, filters: Optional[dict] = None,
+               preferred: Optional[frozenset] = None) -> List[Tuple[Document, float]]:
+        """
+        Return the top RAG_K_RESULTS (doc, cosine score) pairs.
+
+        With keyword_hits or preferred, rankings are merged by reciprocal
+        rank fusion (see fuse). keyword_hits must have been computed with
+        the same filters; preferred comes from route().
+        """
+        if keyword_hits is None and preferred is None:
+            dense = self.dense_search(query_emb, RAG_K_RESULTS, filters)
+            return self.fuse(query_emb, dense, None)
+
+        dense = self.dense_search(query_emb, RAG_HYBRID_CANDIDATES, filters)
+        return self.fuse(query_emb, dense, keyword_hits, preferred)
+
+    def fuse(self, query_emb, dense, keyword_hits=None,
+             preferred: Optional[frozenset] = None) -> List[Tuple[Document, float]]:
+        """
+        Top RAG_K_RESULTS (doc, cosine score) pairs from a dense ranking,
+        RRF-fused with keyword_hits if given. Candidates in the preferred
+        (routed) chunk ids get one more RRF vote, so routing reorders but
+        never hides.
+
+        Every candidate, keyword-only ones included, must reach
+        RAG_SCORE_THRESHOLD cosine similarity to query_emb. Each doc
+        carries its cosine as metadata["score"] and, when fused, its
+        position in the fused ranking as metadata["fused_rank"].
+        """
+        if keyword_hits is None and preferred is None:
+            return [self._hit(i, score) for i, score in dense[:RAG_K_RESULTS]]
+
+        keyword_hits = self.vet_keyword_hits(query_emb, dense, keyword_hits)
+        cosine = dict(dense)
+        rankings = [[i for i, _ in dense]]
+        if keyword_hits is not None:
+            cosine.update(keyword_hits)
+            rankings.append([i for i, _ in keyword_hits])
+        if preferred:
+            candidates = dict.fromkeys(i for ranking in rankings for i in ranking)
+            rankings.append([i for i in candidates if i in preferred])
+        fused = reciprocal_rank_fusion(rankings, k=RAG_RRF_K)
+        return [self._hit(i, cosine[i], rank) for rank, (i, _) in enumerate(fused[:RAG_K_RESULTS], start=1)]
+
+    def _hit(self, chunk_id: int, score: float, fused_rank: Optional[int] = None) -> Tuple[Document, float]:
+        doc = self.chunks[chunk_id]
+        doc.metadata["score"] = round(score, 4)
+        if fused_rank is not None:
+            doc.metadata["fused_rank"] = fused_rank
+        return doc, score
+
+    def keyword_documents(self, query: str, filters: dict, k: int) -> List[Document]:
+        """BM25-only lookup within filters: no embedding round trip."""
+        if self.bm25 is None:
+            return []
+        ids, _ = self._restriction(filters)
+        if not len(ids):
+            return []
+        return [self.chunks[i] for i, _ in self.bm25.search(query, k, ids)]
+
+    def context_documents(self, hits: List[Tuple[Document, float]], sections: Optional[List[str]] = None,
+                          include_hits: bool = True) -> List[Document]:
+        """
+        Expand search hits into prompt context, grouped by candidate disease.
+
+        Each disease among the hits (best first) contributes its sections
+        (default RAG_CONTEXT_SECTIONS) followed by its matched sections,
+        each chunk once. Indexes without section chunks return the hits
+        unchanged.
+        """
+        if self.manifest.get("chunking") != "sections":
+            return [doc for doc, _ in hits]
+
+        matched = {}
+        for doc, _ in hits:
+            matched.setdefault(doc.metadata["source"], []).append(doc)
+
+        files = self.manifest.get("files", {})
         docs = []
-        for i, dist in zip(indices[0], distances[0]):
-            if i != -1:
-                # Simple heuristic to simulate score threshold
-                # FlatL2 distance increases with dissimilarity
-                # This is just a basic implementation
-                docs.append(self.chunks[i])
+        for source, source_hits in matched.items():
+            hit_ids = {doc.metadata.get("chunk_id") for doc in source_hits} if include_hits else set()
+            source_sections = files.get(source, {}).get("sections", {})
+            for key in RAG_CONTEXT_SECTIONS if sections is None else sections:
+                docs.extend(self.chunks[i] for i in source_sections.get(key, []) if i not in hit_ids)
+            if include_hits:
+                docs.extend(source_hits)
         return docs
 
-# Initialize embeddings using OpenRouter (via OpenAI-compatible API)
+    def invoke(self, query: str, filters: Optional[dict] = None) -> List[Document]:
+        return [doc for doc, _ in self.search(self.embed(query), self.keyword_search(query, filters), filters)]
+
+    async def ainvoke(self, query: str, filters: Optional[dict] = None) -> List[Document]:
+        keyword_task = asyncio.create_task(asyncio.to_thread(self.keyword_search, query, filters))
+        query_emb = await self.aembed(query)
+        return [doc for doc, _ in self.search(query_emb, await keyword_task, filters)]
+
+# Initialize the configured embeddings provider
+embeddings = None
 try:
-    if not OPENROUTER_API_KEY:
-        raise ValueError("OPENROUTER_API_KEY not set in .env")
-    
-    embeddings = OpenAIEmbeddings(
-        api_key=SecretStr(OPENROUTER_API_KEY),
-        model=EMBEDDINGS_MODEL,
-        base_url=OPENROUTER_BASE_URL
-    )
-    logger.info(f"✅ Using OpenRouter for embeddings: {EMBEDDINGS_MODEL}")
+    embeddings = get_embeddings()
     
     # Load FAISS vector store
-    if os.path.exists(FAISS_INDEX_DIR) and os.path.exists(os.path.join(FAISS_INDEX_DIR, "index.faiss")):
-        retriever = SimpleRetriever(FAISS_INDEX_DIR, embeddings)
-        logger.info(f"✅ Vector DB initialized from {FAISS_INDEX_DIR}")
+    index_dir = active_generation_dir(FAISS_INDEX_DIR)
+    if index_dir is not None:
+        retriever = SimpleRetriever(index_dir, embeddings)
+        logger.info(f"✅ Vector DB initialized from {index_dir}")
     else:
         logger.warning(f"⚠️  Vector DB directory {FAISS_INDEX_DIR} or index files not found. Retrieval will be disabled.")
         retriever = None
@@ -68,51 +393,148 @@ except Exception as e:
     retriever = None
 
 
-def rag_answer(query: str) -> dict:
+# ============= HOT RELOAD =============
+# Read-copy-update: a new SimpleRetriever is fully loaded before the module
+# reference is swapped. Queries grab the reference once, so in-flight ones
+# finish on the index they started with and the old one is freed afterwards.
+_reload_lock = threading.Lock()
+# Callbacks run with the new index version after each swap (e.g. the follow-up question cache)
+_reload_listeners = []
+
+
+def register_reload_listener(listener):
+    """Register a callable run with the new index version whenever reload_retriever swaps generations."""
+    _reload_listeners.append(listener)
+
+
+def index_version() -> Optional[int]:
+    """Version of the index generation in use, or None without one."""
+    current = retriever
+    return current.version if current is not None else None
+
+
+def get_index_info() -> dict:
+    """Describe the index generation currently serving queries."""
+    current = retriever
+    if current is None:
+        return {"loaded": False, "version": None, "index_dir": None, "chunks": 0, "loaded_at": None}
+    return {
+        "loaded": True,
+        "version": current.version,
+        "index_dir": current.index_dir,
+        "chunks": current.index.ntotal,
+        "loaded_at": current.loaded_at,
+        "created_at": current.manifest.get("created_at"),
+        "metric": "cosine" if current.index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2",
+        "partitions": {name: len(ids) for name, ids in current.partitions.items()},
+        "retrieval": get_retrieval_stats(),
+    }
+
+
+def reload_retriever(force: bool = False) -> dict:
     """
-    Retrieve and analyze medical context for given query.
-    Uses caching to avoid redundant vector DB lookups.
+    Load the active index generation if it differs from the one in use.
+
+    Blocking (reads the index from disk); call it off the event loop.
     """
-    raw_response = ""  # Initialize to avoid unbound variable error
-    
-    # Check cache
-    if RAG_CACHE_ENABLED and query in _rag_cache:
-        import hashlib
-        query_hash = hashlib.md5(query.encode()).hexdigest()[:10]
-        logger.debug(f"📦 Cache hit for query id: {query_hash}")
-        return _rag_cache[query]
-    
-    # Fallback if retriever not initialized
-    if retriever is None:
-        logger.warning("⚠️  Vector DB not available, using fallback")
-        return {
-            "possible_conditions": ["Medical evaluation recommended"],
-            "explanation": ["Vector database unavailable."],
-            "home_care_tips": ["Rest", "Stay hydrated", "Monitor symptoms"],
-            "when_to_see_doctor": ["Consult a healthcare professional."],
-            "disclaimer": "This is not a medical diagnosis."
-        }
+    global retriever
+    with _reload_lock:
+        if embeddings is None:
+            raise RuntimeError("Embeddings not initialized; cannot load vector DB")
+        index_dir = active_generation_dir(FAISS_INDEX_DIR)
+        if index_dir is None:
+            logger.warning(f"⚠️  No index generation found under {FAISS_INDEX_DIR}")
+            return {"reloaded": False, **get_index_info()}
+
+        current = retriever
+        if not force and current is not None and current.index_dir == index_dir:
+            return {"reloaded": False, **get_index_info()}
+
+        new_retriever = SimpleRetriever(index_dir, embeddings)
+        retriever = new_retriever
+        invalidate_caches()
+
+    for listener in _reload_listeners:
+        try:
+            listener(new_retriever.version)
+        except Exception as e:
+            logger.warning(f"⚠️  Reload listener {getattr(listener, '__name__', listener)} failed: {e}")
+
+    logger.info(f"🔄 Vector DB reloaded: version {new_retriever.version} from {index_dir}")
+    return {"reloaded": True, **get_index_info()}
+
+
+def lookup_sections(query: str, section_keys: List[str], k: int) -> List[Document]:
+    """Best keyword matches among the given sections of the live index (empty if none is loaded)."""
+    current = retriever
+    if current is None:
+        return []
+    return current.keyword_documents(query, {"section_key": section_keys}, k)
+
+
+class RetrievalContext(NamedTuple):
+    """
+    One retrieval, kept so a later turn of the same conversation can reuse it.
+
+    dense holds up to RAG_HYBRID_CANDIDATES (chunk_id, cosine) pairs for
+    query; they are only valid for the index generation in index_dir.
+    """
+    query: str
+    query_emb: np.ndarray
+    dense: List[Tuple[int, float]]
+    filters: Optional[dict]
+    index_dir: str
+    hits: List[Tuple[Document, float]]
+
+
+@traced("retrieve")
+async def aretrieve(query: str, filters: Optional[dict] = None) -> Optional[RetrievalContext]:
+    """Embed and search once for query; None when no index is loaded or retrieval fails."""
+    validate_filters(filters)
+    current = retriever
+    if current is None:
+        return None
 
     try:
-        docs = retriever.invoke(query)
-        logger.info(f"📄 Retrieved {len(docs)} documents for query")
-
-        if not docs:
-            logger.warning(f"⚠️  No documents matched query threshold")
-            return {
-                "possible_conditions": ["Medical evaluation recommended"],
-                "explanation": ["No strong medical matches found."],
-                "home_care_tips": ["Rest", "Stay hydrated", "Monitor symptoms"],
-                "when_to_see_doctor": ["If symptoms persist or worsen."],
-                "disclaimer": "This is not a medical diagnosis."
-            }
-
-        context = "\n\n".join(
-            f"Source: {doc.metadata.get('source','unknown')}\n{doc.page_content}"
-            for doc in docs
-        )
+        preferred = None if filters else current.route(query)
+        keyword_task = asyncio.create_task(asyncio.to_thread(current.keyword_search, query, filters))
+        with timed("embed"):
+            query_emb = await current.aembed(query)
+        with timed("search"):
+            dense = current.dense_search(query_emb, RAG_HYBRID_CANDIDATES, filters)
+            hits = current.fuse(query_emb, dense, await keyword_task, preferred)
+    except Exception as e:
+        logger.warning(f"⚠️  Retrieval failed: {e}")
+        return None
+    return RetrievalContext(query, query_emb, dense, filters, current.index_dir, hits)
+
+
+def differential_documents(context: RetrievalContext, sections: List[str]) -> List[Document]:
+    """The given sections of every candidate disease in a stored retrieval."""
+    current = retriever
+    if current is None or current.index_dir != context.index_dir:
+        return []
+    return current.context_documents(context.hits, sections, include_hits=False)
+
 
-        prompt = f"""
+def _fallback_response(explanation: str, when_to_see_doctor: str) -> dict:
+    return {
+        "possible_conditions": ["Medical evaluation recommended"],
+        "explanation": [explanation],
+        "home_care_tips": ["Rest", "Stay hydrated", "Monitor symptoms"],
+        "when_to_see_doctor": [when_to_see_doctor],
+        "disclaimer": "This is not a medical diagnosis."
+    }
+
+
+def _build_prompt(query: str, docs: list) -> str:
+    """Build the grounded analysis prompt from retrieved documents."""
+    context = "\n\n".join(
+        f"Source: {doc.metadata.get('source','unknown')}\n{doc.page_content}"
+        for doc in docs
+    )
+
+    return f"""
 You are Carenova, a cautious AI healthcare assistant.
 
 STRICT RULES:
@@ -147,44 +569,253 @@ IMPORTANT:
 - Output MUST be valid JSON
 """
 
-        llm = get_llm()
-        response_message = llm.invoke(prompt)
-        raw_response = response_message.content if hasattr(response_message, 'content') else str(response_message)
-        
-        logger.debug(f"🤖 LLM response received: {len(raw_response)} chars")
 
-        # Clean response
-        raw_response = raw_response.strip() if isinstance(raw_response, str) else str(raw_response).strip()
+def _cache_key(query: str, filters: Optional[dict]) -> str:
+    key = normalize_query(query)
+    return f"{key} #filters={json.dumps(filters, sort_keys=True)}" if filters else key
 
-        result = json.loads(raw_response)
-        
-        # Cache result
-        if RAG_CACHE_ENABLED:
-            _rag_cache[query] = result
-        
-        logger.info(f"✅ Analysis complete: {', '.join(result.get('possible_conditions', []))}")
-        return result
 
-    except json.JSONDecodeError as e:
+async def _aprepare(query: str, filters: Optional[dict] = None,
+                    retrieval: Optional[RetrievalContext] = None) -> Tuple[Optional[dict], Optional[str], Optional[np.ndarray]]:
+    """
+    Resolve everything that happens before generation.
+
+    Returns (answer, None, None) when the query can be answered without the
+    LLM (cache hit or fallback), otherwise (None, prompt, query_embedding).
+    Without explicit filters, the router may boost a few body systems in
+    the ranking; everything is still searched.
+
+    With a retrieval from earlier in the conversation (same index), its
+    dense candidates are re-ranked with BM25 over the full query instead of
+    embedding again; query_embedding is then None.
+    """
+    # Check cache
+    if RAG_CACHE_ENABLED:
+        cached = _rag_cache.get(_cache_key(query, filters))
+        if cached is not None:
+            import hashlib
+            query_hash = hashlib.md5(query.encode()).hexdigest()[:10]
+            logger.debug(f"📦 Cache hit for query id: {query_hash}")
+            current_span().set_attribute("cache", "exact")
+            return cached, None, None
+    
+    # Snapshot the retriever so a concurrent hot reload cannot swap it mid-query
+    current = retriever
+
+    # Fallback if retriever not initialized
+    if current is None:
+        logger.warning("⚠️  Vector DB not available, using fallback")
+        return _fallback_response(
+            "Vector database unavailable.",
+            "Consult a healthcare professional."
+        ), None, None
+
+    if retrieval is not None and not filters and retrieval.index_dir == current.index_dir:
+        with timed("search"):
+            keyword_hits = await asyncio.to_thread(current.keyword_search, query, retrieval.filters)
+            hits = current.fuse(retrieval.query_emb, retrieval.dense, keyword_hits, current.route(query))
+        logger.info(f"♻️  Re-ranked {len(retrieval.dense)} stored candidates; no new embedding")
+        return _prompt_or_fallback(query, current, hits, None)
+
+    preferred = None if filters else current.route(query)
+
+    # BM25 runs on a worker thread while the query embedding is in flight
+    keyword_task = asyncio.create_task(asyncio.to_thread(current.keyword_search, query, filters))
+    with timed("embed"):
+        query_emb = await current.aembed(query)
+
+    # Semantic neighbours may have been answered under different filters
+    if RAG_SEMANTIC_CACHE_ENABLED and not filters:
+        cached = _semantic_cache.lookup(query_emb)
+        if cached is not None:
+            logger.debug("📦 Semantic cache hit")
+            current_span().set_attribute("cache", "semantic")
+            keyword_task.cancel()
+            return cached, None, None
+
+    with timed("search"):
+        hits = current.search(query_emb, await keyword_task, filters, preferred)
+    return _prompt_or_fallback(query, current, hits, query_emb)
+
+
+def _prompt_or_fallback(query: str, current: SimpleRetriever, hits, query_emb):
+    scores = ", ".join(f"{doc.metadata.get('source', 'unknown')}={score:.3f}" for doc, score in hits)
+    logger.info(f"📄 Retrieved {len(hits)} documents for query: {scores}")
+    current_span().set_attribute("documents", len(hits))
+
+    if not hits:
+        logger.warning(f"⚠️  No documents matched query threshold")
+        return _fallback_response(
+            "No strong medical matches found.",
+            "If symptoms persist or worsen."
+        ), None, None
+
+    with timed("prompt"):
+        prompt = _build_prompt(query, current.context_documents(hits))
+    return None, prompt, query_emb
+
+
+def _finish(query: str, raw_response, query_emb: Optional[np.ndarray], filters: Optional[dict] = None,
+            parsed: Optional[dict] = None) -> dict:
+    """
+    Parse the raw LLM output and cache the result.
+
+    parsed is the object already assembled by a streaming parser; it is
+    used as-is so the result matches the fields the client was sent.
+    """
+    logger.debug(f"🤖 LLM response received: {len(raw_response)} chars")
+
+    # Clean response
+    raw_response = raw_response.strip() if isinstance(raw_response, str) else str(raw_response).strip()
+
+    with timed("parse"):
+        result = dict(parsed) if parsed is not None else json.loads(raw_response)
+    
+    # Cache result
+    if RAG_CACHE_ENABLED:
+        _rag_cache.set(_cache_key(query, filters), result)
+    if RAG_SEMANTIC_CACHE_ENABLED and not filters and query_emb is not None:
+        _semantic_cache.add(query_emb, result)
+    
+    logger.info(f"✅ Analysis complete: {', '.join(result.get('possible_conditions', []))}")
+    return result
+
+
+def _error_response(e: Exception, raw_response) -> dict:
+    if isinstance(e, asyncio.TimeoutError):
+        ERRORS.inc(stage="llm_deadline")
+        logger.error("⏱️  LLM call cut off at the request deadline")
+        return _fallback_response(
+            "The analysis took too long to complete.",
+            "If symptoms persist or worsen."
+        )
+
+    if isinstance(e, json.JSONDecodeError):
+        ERRORS.inc(stage="parse")
         logger.error(f"❌ JSON parse error: {e}")
         # Use content attribute if it's an AIMessage object, otherwise string slice
         error_snippet = raw_response[:200] if isinstance(raw_response, str) else "Unable to display response"
         logger.error(f"Raw response: {error_snippet}")
         
-        return {
-            "possible_conditions": ["Medical evaluation recommended"],
-            "explanation": ["The system could not parse the medical analysis response."],
-            "home_care_tips": ["Rest", "Stay hydrated", "Monitor symptoms"],
-            "when_to_see_doctor": ["If symptoms worsen or persist."],
-            "disclaimer": "This is not a medical diagnosis."
-        }
-    
+        return _fallback_response(
+            "The system could not parse the medical analysis response.",
+            "If symptoms worsen or persist."
+        )
+
+    ERRORS.inc(stage="rag")
+    logger.error(f"❌ Unexpected error in rag_answer: {e}")
+    return _fallback_response(
+        "System error occurred.",
+        "Seek immediate medical attention if severe."
+    )
+
+
+@traced("rag_answer")
+async def async_rag_answer(query: str, filters: Optional[dict] = None,
+                           retrieval: Optional[RetrievalContext] = None) -> dict:
+    """
+    Retrieve and analyze medical context for given query.
+    Uses caching to avoid redundant vector DB lookups.
+
+    Embedding and generation go through the async LangChain clients, so the
+    caller's event loop is never blocked on network I/O. filters restricts
+    retrieval by metadata, e.g. {"body_system": ["respiratory"],
+    "section_key": "common_symptoms"}. retrieval is a RetrievalContext
+    from earlier in the conversation (see aretrieve) to reuse.
+
+    Concurrent calls for the same normalized query share one answer.
+    """
+    validate_filters(filters)
+    if not RAG_SINGLE_FLIGHT_ENABLED:
+        return await _async_rag_answer(query, filters, retrieval)
+    try:
+        return await _single_flight.run(_cache_key(query, filters), lambda: _async_rag_answer(query, filters, retrieval))
+    except asyncio.TimeoutError as e:
+        # Deadline passed while waiting on an identical in-flight query
+        return _error_response(e, "")
+
+
+async def _async_rag_answer(query: str, filters: Optional[dict], retrieval: Optional[RetrievalContext]) -> dict:
+    raw_response = ""  # Initialize to avoid unbound variable error
+
+    try:
+        answer, prompt, query_emb = await _aprepare(query, filters, retrieval)
+        if answer is not None:
+            return answer
+
+        llm = get_llm()
+        with timed("llm"):
+            response_message = await with_deadline(llm.ainvoke(prompt))
+        record_tokens("analysis", response_message)
+        raw_response = response_message.content if hasattr(response_message, 'content') else str(response_message)
+        return _finish(query, raw_response, query_emb, filters)
+
+    except Exception as e:
+        return _error_response(e, raw_response)
+
+
+@traced("rag_answer")
+async def astream_rag_answer(query: str, filters: Optional[dict] = None,
+                             retrieval: Optional[RetrievalContext] = None) -> AsyncIterator[dict]:
+    """
+    Streaming variant of async_rag_answer.
+
+    Yields {"type": "field", "field": ..., "data": ...} events as each
+    top-level JSON field closes in the LLM token stream, then a single
+    {"type": "result", "data": ...} event with the fully parsed answer.
+    A duplicate of a query already in flight waits for that answer, without
+    holding an admission slot and no longer than its deadline, and yields
+    only the result event.
+    """
+    validate_filters(filters)
+    raw_response = ""
+    answer = None
+    flight = None
+
+    try:
+        if RAG_SINGLE_FLIGHT_ENABLED:
+            key = _cache_key(query, filters)
+            shared = _single_flight.join(key)
+            if shared is not None:
+                current_span().set_attribute("coalesced", True)
+                answer = await wait_without_slot(asyncio.shield(shared))
+                if answer is None:
+                    await reclaim_slot()
+            if answer is None:
+                flight = _single_flight.lead(key)
+
+        if answer is None:
+            answer, prompt, query_emb = await _aprepare(query, filters, retrieval)
+        if answer is None:
+            llm = get_llm()
+            parser = IncrementalJSONParser()
+            with timed("llm"):
+                async for chunk in iterate_with_deadline(llm.astream(prompt)):
+                    # With stream_usage, the final chunk carries the token counts
+                    record_tokens("analysis", chunk)
+                    token = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                    if not isinstance(token, str) or not token:
+                        continue
+                    raw_response += token
+                    for field, value in parser.feed(token):
+                        yield {"type": "field", "field": field, "data": value}
+            # Once the object has closed, text the model wrote around it does not matter
+            answer = _finish(query, raw_response, query_emb, filters, parser.fields if parser.done else None)
+
+    except Overloaded:
+        raise
+
     except Exception as e:
-        logger.error(f"❌ Unexpected error in rag_answer: {e}")
-        return {
-            "possible_conditions": ["Medical evaluation recommended"],
-            "explanation": ["System error occurred."],
-            "home_care_tips": ["Rest", "Stay hydrated", "Monitor symptoms"],
-            "when_to_see_doctor": ["Seek immediate medical attention if severe."],
-            "disclaimer": "This is not a medical diagnosis."
-        }
+        answer = _error_response(e, raw_response)
+
+    finally:
+        # Also runs when the consumer stops early; followers then answer on their own
+        if flight is not None:
+            _single_flight.land(key, flight, answer)
+
+    yield {"type": "result", "data": answer}
+
+
+def rag_answer(query: str, filters: Optional[dict] = None) -> dict:
+    """Synchronous wrapper around async_rag_answer for the CLI and Streamlit app."""
+    return run_sync(async_rag_answer(query, filters))
@@ -0,0 +1,51 @@
+"""
+Cheap keyword router from a query to the body-system partitions worth searching.
+
+The knowledge base is organized by body system (respiratory/,
+infectious/, ...). Each partition gets a keyword profile from the
+profile sections of its diseases (Diagnostic Hint, Common Symptoms, ...);
+a query is routed to the partitions whose profiles share the most
+distinctive terms with it. Retrieval ranks chunks from those partitions
+higher but still searches everything (see SimpleRetriever.route).
+"""
+
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from bm25 import tokenize
+
+PROFILE_SECTIONS = ("diagnostic_hint", "common_symptoms", "key_differentiating_symptoms")
+
+
+class PartitionRouter:
+    def __init__(self, profiles: Dict[str, Iterable[str]]):
+        """profiles maps partition name -> profile texts."""
+        self.profiles = {name: set(t for text in texts for t in tokenize(text)) for name, texts in profiles.items()}
+        # Terms found in every partition cannot discriminate between them
+        n = len(self.profiles)
+        df = Counter(term for terms in self.profiles.values() for term in terms)
+        self.weights = {term: math.log(n / count) for term, count in df.items() if count < n}
+
+    def __len__(self) -> int:
+        return len(self.profiles)
+
+    def route(self, query: str, max_partitions: int, min_share: float) -> Optional[List[str]]:
+        """
+        Return the partitions to search, best first, or None to search everything.
+
+        Keeps partitions scoring at least min_share of the best score, up to
+        max_partitions. Queries with no distinctive terms are not routed.
+        """
+        terms = set(tokenize(query))
+        scores = {
+            name: sum(self.weights.get(term, 0.0) for term in terms & profile)
+            for name, profile in self.profiles.items()
+        }
+        best = max(scores.values(), default=0.0)
+        if best <= 0:
+            return None
+
+        ranked = sorted((name for name, score in scores.items() if score >= min_share * best),
+                        key=lambda name: scores[name], reverse=True)[:max_partitions]
+        return ranked if len(ranked) < len(self.profiles) else None
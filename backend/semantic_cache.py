@@ -0,0 +1,118 @@
+"""
+Semantic response cache keyed on query embeddings.
+Returns a cached answer when a new query is within a cosine distance of one
+that was already answered.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Small FAISS inner-product index over L2-normalized query embeddings.
+
+    Cosine distance is 1 - inner product, so a lookup hits when the nearest
+    live entry is within max_distance of the query.
+    """
+
+    SEARCH_K = 4
+
+    def __init__(self, max_distance: float, max_entries: int, ttl_seconds: float):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._index = None
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vec = np.asarray(embedding, dtype="float32").reshape(1, -1).copy()
+        faiss.normalize_L2(vec)
+        return vec
+
+    def lookup(self, embedding) -> Optional[Any]:
+        """Return the cached answer for the nearest similar query, if any."""
+        vec = self._normalize(embedding)
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0 or vec.shape[1] != self._index.d:
+                self.misses += 1
+                return None
+
+            now = time.monotonic()
+            scores, ids = self._index.search(vec, min(self.SEARCH_K, self._index.ntotal))
+            expired = []
+            result = None
+            for score, entry_id in zip(scores[0], ids[0]):
+                if entry_id == -1 or 1.0 - score > self.max_distance:
+                    break
+                value, expires_at = self._entries[int(entry_id)]
+                if self.ttl_seconds > 0 and now > expires_at:
+                    expired.append(int(entry_id))
+                    continue
+                result = value
+                break
+
+            if expired:
+                self._remove(expired)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def add(self, embedding, value: Any):
+        """Cache an answer under its query embedding."""
+        vec = self._normalize(embedding)
+        with self._lock:
+            if self._index is None or vec.shape[1] != self._index.d:
+                self._index = faiss.IndexIDMap(faiss.IndexFlatIP(vec.shape[1]))
+                self._entries.clear()
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vec, np.array([entry_id], dtype="int64"))
+            self._entries[entry_id] = (value, time.monotonic() + self.ttl_seconds)
+
+            overflow = len(self._entries) - self.max_entries
+            if self.max_entries > 0 and overflow > 0:
+                self._remove(list(self._entries)[:overflow])
+                self.evictions += overflow
+
+    def clear(self):
+        """Drop every entry, e.g. after the knowledge index was rebuilt."""
+        with self._lock:
+            self._index = None
+            self._entries.clear()
+            self.invalidations += 1
+
+    def _remove(self, entry_ids):
+        self._index.remove_ids(np.array(entry_ids, dtype="int64"))
+        for entry_id in entry_ids:
+            self._entries.pop(entry_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "max_distance": self.max_distance,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -4,8 +4,12 @@ Handles symptom analysis, follow-up questions, and streaming LLM responses.
 """
 
 import asyncio
+import hmac
 import json
 import os
+import re
+import time
+import uuid
 from pathlib import Path
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
@@ -13,7 +17,7 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, WebSocket, HTTPException, Depends, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
 from slowapi import Limiter
@@ -37,10 +41,15 @@ from models import (
     ContactForm,
     ContactResponse
 )
-from chatbot import analyze
-from adaptive_questions import generate_followup_questions
-from logger import get_logger
+from admission import AdmissionController, Overloaded
+from chatbot import answered_by_triage, async_analyze, astream_analyze
+from rag import aretrieve, get_cache_stats, get_index_info, reload_retriever
+from adaptive_questions import agenerate_followup_questions
+from question_cache import get_cached_questions, get_question_cache_stats
+from logger import get_logger, get_logging_stats
 from llm import get_llm
+import metrics
+import tracing
 from config import (
     HOST,
     PORT,
@@ -49,7 +58,13 @@ from config import (
     ALLOWED_ORIGINS,
     RATE_LIMIT_PER_MINUTE,
     SESSION_TIMEOUT_MINUTES,
-    MAX_FOLLOWUP_QUESTIONS
+    MAX_FOLLOWUP_QUESTIONS,
+    INDEX_RELOAD_INTERVAL_SECONDS,
+    ADMIN_API_KEY,
+    ANALYSIS_MAX_CONCURRENCY,
+    ANALYSIS_MAX_QUEUE,
+    ANALYSIS_DEADLINE_SECONDS,
+    METRICS_ENABLED
 )
 
 logger = get_logger(__name__)
@@ -57,6 +72,32 @@ logger = get_logger(__name__)
 # ============= RATE LIMITING =============
 limiter = Limiter(key_func=get_remote_address)
 
+# ============= ADMISSION CONTROL =============
+analysis_admission = AdmissionController(
+    max_concurrency=ANALYSIS_MAX_CONCURRENCY,
+    max_queue=ANALYSIS_MAX_QUEUE,
+    deadline_seconds=ANALYSIS_DEADLINE_SECONDS
+)
+
+
+@asynccontextmanager
+async def admit_analysis(symptom_text: str):
+    """Analysis slot for async_analyze; red flags it answers from the triage template never queue."""
+    if answered_by_triage(symptom_text):
+        yield
+        return
+    async with analysis_admission.admit():
+        yield
+
+
+def overloaded_response(e: Overloaded) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy, please retry shortly",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
 # ============= SESSION STORAGE =============
 _sessions: Dict[str, Dict] = {}
 sessions_lock = asyncio.Lock()
@@ -72,6 +113,7 @@ async def get_or_create_session(session_id: str) -> Dict:
                 "messages": [],
                 "initial_symptoms": None,
                 "followup_answers": [],
+                "retrieval": None,
                 "analysis_result": None
             }
         else:
@@ -84,12 +126,29 @@ async def get_or_create_session(session_id: str) -> Dict:
                     "messages": [],
                     "initial_symptoms": None,
                     "followup_answers": [],
+                    "retrieval": None,
                     "analysis_result": None
                 }
         
         return _sessions[session_id]
 
 
+async def get_session_retrieval(session_id: Optional[str], initial_symptoms: str):
+    """Retrieval stashed by /followup-questions for the same initial symptoms, if any."""
+    if not session_id:
+        return None
+    session = await get_or_create_session(session_id)
+    if session.get("initial_symptoms") != initial_symptoms:
+        return None
+    retrieval = session.get("retrieval")
+    # Cached follow-ups leave the retrieval running in the background
+    if isinstance(retrieval, asyncio.Task):
+        if retrieval.done():
+            return None if retrieval.cancelled() else retrieval.result()
+        return await retrieval
+    return retrieval
+
+
 async def cleanup_expired_sessions():
     """Background task to cleanup expired sessions."""
     while True:
@@ -106,6 +165,16 @@ async def cleanup_expired_sessions():
                 logger.info(f"🧹 Cleaned up {len(expired_ids)} expired sessions")
 
 
+async def watch_index_generation():
+    """Background task to hot-reload the vector DB when ingest publishes a new generation."""
+    while True:
+        await asyncio.sleep(INDEX_RELOAD_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(reload_retriever)
+        except Exception as e:
+            logger.warning(f"⚠️  Index reload check failed: {e}")
+
+
 # ============= LIFESPAN (Startup/Shutdown) =============
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -114,6 +183,10 @@ async def lifespan(app: FastAPI):
     
     # Startup
     cleanup_task = asyncio.create_task(cleanup_expired_sessions())
+    reload_task = (
+        asyncio.create_task(watch_index_generation())
+        if INDEX_RELOAD_INTERVAL_SECONDS > 0 else None
+    )
     try:
         llm = get_llm()  # Test LLM connectivity
         logger.info("✅ LLM connection verified")
@@ -124,6 +197,8 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     cleanup_task.cancel()
+    if reload_task:
+        reload_task.cancel()
     logger.info("🛑 Carenova API shutting down...")
 
 
@@ -147,6 +222,40 @@ app.state.limiter = limiter
 
 
 # ============= MIDDLEWARE =============
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def request_id_from(headers) -> str:
+    """The caller's X-Request-ID when it is well-formed, otherwise a fresh one."""
+    request_id = headers.get("X-Request-ID", "")
+    return request_id if REQUEST_ID_PATTERN.match(request_id) else uuid.uuid4().hex
+
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    """
+    Trace each request under its X-Request-ID (echoed back), and count and
+    time it per route template (not raw path, to bound label cardinality).
+    """
+    request_id = request_id_from(request.headers)
+    started = time.perf_counter()
+    status = 500
+    with tracing.span(request.method, kind="SERVER", request_id=request_id, **{"http.method": request.method}) as root:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers["X-Request-ID"] = request_id
+            return response
+        finally:
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            root.update_name(f"{request.method} {path}")
+            root.set_attribute("http.route", path)
+            root.set_attribute("http.status_code", status)
+            metrics.HTTP_REQUESTS.inc(method=request.method, path=path, status=str(status))
+            metrics.HTTP_SECONDS.observe(time.perf_counter() - started, path=path)
+
+
 if ENABLE_CORS:
     app.add_middleware(
         CORSMiddleware,
@@ -177,33 +286,6 @@ async def serve_frontend():
     return FileResponse(str(frontend_path))
 
 
-@app.get("/{file_path:path}", tags=["Frontend"])
-async def serve_static_files(file_path: str):
-    """Serve static files (HTML, CSS, JS) from frontend directory."""
-    frontend_base = Path(__file__).parent.parent / "frontend"
-    file_full_path = frontend_base / file_path
-    
-    # Security: prevent directory traversal
-    try:
-        file_full_path = file_full_path.resolve()
-        if not str(file_full_path).startswith(str(frontend_base.resolve())):
-            return JSONResponse(status_code=403, content={"error": "Access denied"})
-    except:
-        return JSONResponse(status_code=403, content={"error": "Invalid path"})
-    
-    # Serve the file if it exists
-    if file_full_path.exists() and file_full_path.is_file():
-        return FileResponse(str(file_full_path))
-    
-    # If not found, try serving index.html for SPA routing
-    if str(file_path).endswith(".html") or not "." in file_path.split("/")[-1]:
-        index_path = frontend_base / "index.html"
-        if index_path.exists():
-            return FileResponse(str(index_path))
-    
-    return JSONResponse(status_code=404, content={"error": f"File not found: {file_path}"})
-
-
 @app.get("/health", response_model=HealthResponse, tags=["System"])
 async def health_check():
     """Health check for load balancers and uptime monitoring."""
@@ -227,6 +309,105 @@ async def health_check():
         )
 
 
+@app.get("/cache/stats", tags=["System"])
+async def cache_stats():
+    """RAG response and follow-up question cache sizes and hit/miss/eviction counters."""
+    return {**get_cache_stats(), "followup": get_question_cache_stats()}
+
+
+def collect_runtime_metrics():
+    """Cache, admission, tracing and logging counters that already live in their components, read at scrape time."""
+    caches = get_cache_stats()
+    followup = get_question_cache_stats()
+    admission = analysis_admission.stats()
+    traces = tracing.get_trace_stats()
+    logs = get_logging_stats()
+    by_cache = {
+        "response": (caches["hits"], caches["misses"], caches["entries"]),
+        "semantic": (caches["semantic"]["hits"], caches["semantic"]["misses"], caches["semantic"]["entries"]),
+        "followup": (followup["hits"] + followup["precomputed_hits"], followup["misses"],
+                     followup["entries"] + followup["precomputed_entries"]),
+    }
+    return [
+        ("carenova_cache_hits_total", "counter", "Cache hits by cache.",
+         [({"cache": name}, hits) for name, (hits, _, _) in by_cache.items()]),
+        ("carenova_cache_misses_total", "counter", "Cache misses by cache.",
+         [({"cache": name}, misses) for name, (_, misses, _) in by_cache.items()]),
+        ("carenova_cache_hit_ratio", "gauge", "Cache hits / lookups by cache.",
+         [({"cache": name}, round(hits / (hits + misses), 4) if hits + misses else 0.0)
+          for name, (hits, misses, _) in by_cache.items()]),
+        ("carenova_cache_entries", "gauge", "Entries held by cache.",
+         [({"cache": name}, entries) for name, (_, _, entries) in by_cache.items()]),
+        ("carenova_single_flight_coalesced_total", "counter", "Queries that waited on an identical in-flight answer.",
+         [({}, caches["single_flight"]["coalesced"])]),
+        ("carenova_admission_active", "gauge", "Analyses running.", [({}, admission["active"])]),
+        ("carenova_admission_queued", "gauge", "Analyses waiting for a slot.", [({}, admission["queued"])]),
+        ("carenova_admission_shed_total", "counter", "Requests answered 503, by reason.",
+         [({"reason": "queue_full"}, admission["rejected"]), ({"reason": "deadline"}, admission["expired_in_queue"])]),
+        ("carenova_trace_spans_total", "counter", "Tracing spans written to the trace file or dropped.",
+         [({"outcome": "exported"}, traces["exported"]), ({"outcome": "dropped"}, traces["dropped"])]),
+        ("carenova_log_records_discarded_total", "counter", "Log records not written, by reason.",
+         [({"reason": "queue_full"}, logs["dropped"]), ({"reason": "sampled"}, logs["sampled_out"])]),
+        ("carenova_log_queue_depth", "gauge", "Log records waiting for the background writer.", [({}, logs["queued"])]),
+    ]
+
+
+metrics.register_collector(collect_runtime_metrics)
+
+
+@app.get("/metrics", tags=["System"], response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint: request/error/token counters, stage latency histograms, cache and queue stats."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admission/stats", tags=["System"])
+async def admission_stats():
+    """Analysis concurrency, queue depth, shed requests and queue wait times."""
+    return analysis_admission.stats()
+
+
+def require_admin(request: Request):
+    """Check the X-Admin-Key header; admin endpoints stay closed until ADMIN_API_KEY is configured."""
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=503, detail="Admin endpoints are disabled: ADMIN_API_KEY is not set")
+    provided = request.headers.get("X-Admin-Key", "")
+    if not hmac.compare_digest(provided.encode(), ADMIN_API_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+
+@app.get("/admin/index", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def index_info():
+    """Report the vector DB generation currently serving queries."""
+    return get_index_info()
+
+
+@app.post(
+    "/admin/reload-index",
+    tags=["Admin"],
+    summary="Hot-reload the vector DB",
+    dependencies=[Depends(require_admin)],
+    responses={
+        200: {"description": "Index checked (and reloaded if a new generation exists)"},
+        401: {"description": "Invalid admin key"},
+        500: {"description": "Reload failed"}
+    }
+)
+async def reload_index(force: bool = False):
+    """
+    Load the latest index generation written by ingest.py without a restart.
+
+    In-flight queries finish on the previous index.
+    """
+    try:
+        return await asyncio.to_thread(reload_retriever, force)
+    except Exception as e:
+        logger.error(f"❌ Index reload failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to reload vector database")
+
+
 @app.post(
     "/followup-questions",
     response_model=FollowupQuestionsResponse,
@@ -235,7 +416,8 @@ async def health_check():
     responses={
         200: {"description": "Questions generated successfully"},
         400: {"description": "Invalid input"},
-        429: {"description": "Rate limit exceeded"}
+        429: {"description": "Rate limit exceeded"},
+        503: {"description": "Server busy; retry after the Retry-After header"}
     }
 )
 @limiter.limit(f"{RATE_LIMIT_PER_MINUTE}/minute")
@@ -243,12 +425,22 @@ async def get_followup_questions(request: Request, symptom_request: FollowupQues
     """
     Generate intelligent follow-up questions based on initial symptoms.
     
-    These questions help differentiate between conditions.
+    These questions help differentiate between conditions. The symptoms
+    are retrieved against once here; with a session_id the retrieval is
+    kept so /analyze can reuse it. Common symptom combinations are answered
+    from the follow-up cache, with the retrieval left running in the
+    background for /analyze.
     """
     try:
         logger.info(f"📝 Generating follow-ups for: {symptom_request.symptoms[:50]}...")
-        
-        questions = generate_followup_questions(symptom_request.symptoms)
+
+        questions = get_cached_questions(symptom_request.symptoms)
+        if questions is not None:
+            retrieval = asyncio.create_task(aretrieve(symptom_request.symptoms)) if symptom_request.session_id else None
+        else:
+            async with analysis_admission.admit():
+                retrieval = await aretrieve(symptom_request.symptoms)
+                questions = await agenerate_followup_questions(symptom_request.symptoms, retrieval, check_cache=False)
         
         # Validate response
         if not isinstance(questions, list) or len(questions) == 0:
@@ -257,10 +449,19 @@ async def get_followup_questions(request: Request, symptom_request: FollowupQues
         
         # Limit questions
         questions = questions[:MAX_FOLLOWUP_QUESTIONS]
+
+        if symptom_request.session_id:
+            session = await get_or_create_session(symptom_request.session_id)
+            session["initial_symptoms"] = symptom_request.symptoms
+            session["followup_answers"] = []
+            session["retrieval"] = retrieval
         
         logger.info(f"✅ Generated {len(questions)} questions")
         return FollowupQuestionsResponse(questions=questions)
-    
+
+    except Overloaded as e:
+        raise overloaded_response(e)
+
     except Exception as e:
         logger.error(f"❌ Followup generation failed: {e}")
         raise HTTPException(
@@ -278,7 +479,8 @@ async def get_followup_questions(request: Request, symptom_request: FollowupQues
         200: {"description": "Analysis complete"},
         400: {"description": "Invalid input"},
         429: {"description": "Rate limit exceeded"},
-        500: {"description": "Analysis failed"}
+        500: {"description": "Analysis failed"},
+        503: {"description": "Server busy; retry after the Retry-After header"}
     }
 )
 @limiter.limit(f"{RATE_LIMIT_PER_MINUTE}/minute")
@@ -297,13 +499,16 @@ async def analyze_symptoms(request: Request, analysis_request: AnalysisRequest):
             + " | ".join(analysis_request.followup_answers)
         )
         
-        # Run analysis off the loop
-        loop = asyncio.get_running_loop()
-        result = await loop.run_in_executor(None, analyze, combined_text)
+        retrieval = await get_session_retrieval(analysis_request.session_id, analysis_request.initial_symptoms)
+        async with admit_analysis(combined_text):
+            result = await async_analyze(combined_text, retrieval)
         
         logger.info(f"✅ Analysis returned: {result.get('severity')}")
         return AnalysisResponse(**result)
-    
+
+    except Overloaded as e:
+        raise overloaded_response(e)
+
     except Exception as e:
         logger.error(f"❌ Analysis failed: {e}")
         raise HTTPException(
@@ -415,6 +620,11 @@ async def verify_auth(request: Request):
         )
 
 
+def websocket_outcome(outcome: str):
+    metrics.WEBSOCKET_SESSIONS.inc(outcome=outcome)
+    tracing.current_span().set_attribute("outcome", outcome)
+
+
 @app.websocket("/ws/chat")
 async def websocket_chat(websocket: WebSocket):
     """
@@ -431,18 +641,35 @@ async def websocket_chat(websocket: WebSocket):
         "type": "thinking",
         "content": "Analyzing your symptoms..."
     },
+    {
+        "type": "triage",
+        "data": {...}
+    },  # only for red-flag symptoms: immediate emergency guidance
+    {
+        "type": "partial",
+        "field": "possible_conditions",
+        "data": [...]
+    },  # one frame per field, as soon as it is generated
     {
         "type": "analysis",
         "data": {...}
     }
     """
+    request_id = request_id_from(websocket.headers)
+    with tracing.span("WS /ws/chat", kind="SERVER", request_id=request_id):
+        await _websocket_chat(websocket)
+
+
+async def _websocket_chat(websocket: WebSocket):
     await websocket.accept()
     logger.info(f"🔗 WebSocket connected: {websocket.client}")
     try:
         try:
-            data = await asyncio.wait_for(websocket.receive_json(), timeout=RECEIVE_TIMEOUT)
+            with tracing.span("receive"):
+                data = await asyncio.wait_for(websocket.receive_json(), timeout=RECEIVE_TIMEOUT)
         except asyncio.TimeoutError:
             logger.warning("🕒 WebSocket receive timeout")
+            websocket_outcome("timeout")
             await websocket.close()
             return
         
@@ -456,12 +683,14 @@ async def websocket_chat(websocket: WebSocket):
                 "type": "error",
                 "message": "Symptoms must be at least 5 characters"
             })
+            websocket_outcome("invalid")
             await websocket.close()
             return
         
         logger.info(f"💬 Session {session_id}: Analyzing {len(followup_answers)} answers")
         
-        # Get or create session
+        # Get or create session, reusing the follow-up step's retrieval
+        retrieval = await get_session_retrieval(session_id, initial_symptoms)
         session = await get_or_create_session(session_id)
         session["initial_symptoms"] = initial_symptoms
         session["followup_answers"] = followup_answers
@@ -472,28 +701,35 @@ async def websocket_chat(websocket: WebSocket):
             "content": "🧠 Analyzing your symptoms..."
         })
         
-        # Brief async pause for UI feedback
-        await asyncio.sleep(0.3)
-        
-        # Run analysis off the loop
         combined_text = (
             initial_symptoms + " | " + " | ".join(followup_answers)
         )
-        loop = asyncio.get_running_loop()
-        result = await loop.run_in_executor(None, analyze, combined_text)
+        
+        # Stream partial fields as the LLM produces them
+        result = None
+        # Triage frames go out at once; the LLM stream after them waits for a slot
+        async for frame in astream_analyze(combined_text, retrieval, admit=analysis_admission.admit):
+            if frame["type"] == "analysis":
+                result = AnalysisResponse(**frame["data"]).model_dump()
+            elif frame["type"] == "triage":
+                await websocket.send_json({"type": "triage", "data": AnalysisResponse(**frame["data"]).model_dump()})
+            else:
+                await websocket.send_json(frame)
         
         # Store in session
         session["analysis_result"] = result
         
-        # Stream analysis result
+        # Stream validated analysis result
         await websocket.send_json({
             "type": "analysis",
             "data": result
         })
         
         logger.info(f"✅ WebSocket analysis complete for {session_id}")
+        websocket_outcome("ok")
     
     except json.JSONDecodeError:
+        websocket_outcome("invalid")
         try:
             await websocket.send_json({
                 "type": "error",
@@ -501,9 +737,21 @@ async def websocket_chat(websocket: WebSocket):
             })
         except:
             pass
+
+    except Overloaded as e:
+        websocket_outcome("shed")
+        try:
+            await websocket.send_json({
+                "type": "error",
+                "message": "Server is busy, please retry shortly",
+                "retry_after": e.retry_after
+            })
+        except:
+            pass
     
     except Exception as e:
         logger.error(f"❌ WebSocket error: {e}")
+        websocket_outcome("error")
         try:
             await websocket.send_json({
                 "type": "error",
@@ -540,6 +788,34 @@ async def get_docs():
     return app.openapi_schema
 
 
+# Registered last so the catch-all path does not shadow the API routes above
+@app.get("/{file_path:path}", tags=["Frontend"])
+async def serve_static_files(file_path: str):
+    """Serve static files (HTML, CSS, JS) from frontend directory."""
+    frontend_base = Path(__file__).parent.parent / "frontend"
+    file_full_path = frontend_base / file_path
+    
+    # Security: prevent directory traversal
+    try:
+        file_full_path = file_full_path.resolve()
+        if not str(file_full_path).startswith(str(frontend_base.resolve())):
+            return JSONResponse(status_code=403, content={"error": "Access denied"})
+    except:
+        return JSONResponse(status_code=403, content={"error": "Invalid path"})
+    
+    # Serve the file if it exists
+    if file_full_path.exists() and file_full_path.is_file():
+        return FileResponse(str(file_full_path))
+    
+    # If not found, try serving index.html for SPA routing
+    if str(file_path).endswith(".html") or not "." in file_path.split("/")[-1]:
+        index_path = frontend_base / "index.html"
+        if index_path.exists():
+            return FileResponse(str(index_path))
+    
+    return JSONResponse(status_code=404, content={"error": f"File not found: {file_path}"})
+
+
 # ============= ERROR HANDLERS =============
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
@@ -0,0 +1,83 @@
+"""
+Single-flight coalescing of concurrent identical requests.
+
+The response caches are only filled once the first answer is back, so a
+burst of identical queries would each start their own LLM call. Calls
+sharing a key while one is in flight wait on that flight instead: N
+simultaneous duplicates cost one computation and all N return together.
+Flights are per event loop and forgotten as soon as they land; from then
+on the caches take over.
+
+Followers give their admission slot back while they wait and stop
+waiting at their own request deadline (see admission.wait_without_slot).
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from admission import reclaim_slot, wait_without_slot
+
+
+class SingleFlight:
+    """In-flight futures by key; the first caller leads, later callers follow."""
+
+    def __init__(self):
+        self._flights: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def _slot(key: str) -> Tuple[asyncio.AbstractEventLoop, str]:
+        return asyncio.get_running_loop(), key
+
+    def _forget(self, slot, future: asyncio.Future):
+        if self._flights.get(slot) is future:
+            del self._flights[slot]
+
+    def join(self, key: str) -> Optional[asyncio.Future]:
+        """The in-flight future for key, counted as a coalesced call, or None."""
+        future = self._flights.get(self._slot(key))
+        if future is not None:
+            self.coalesced += 1
+        return future
+
+    def lead(self, key: str) -> asyncio.Future:
+        """Register a flight the caller computes itself; resolve it with land()."""
+        slot = self._slot(key)
+        future = slot[0].create_future()
+        self._flights[slot] = future
+        self.leaders += 1
+        return future
+
+    def land(self, key: str, future: asyncio.Future, result: Any):
+        """Hand result to the followers of a lead() flight; None tells them to compute their own."""
+        if not future.done():
+            future.set_result(result)
+        self._forget(self._slot(key), future)
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await factory() once for all concurrent callers with key.
+
+        The computation runs as its own task, so a leader that goes away
+        (client disconnect) does not cancel it for the followers. Followers
+        raise asyncio.TimeoutError at their request deadline.
+        """
+        shared = self.join(key)
+        if shared is not None:
+            result = await wait_without_slot(asyncio.shield(shared))
+            if result is not None:
+                return result
+            # A streaming leader that was abandoned lands None
+            await reclaim_slot()
+            return await factory()
+
+        slot = self._slot(key)
+        task = asyncio.ensure_future(factory())
+        self._flights[slot] = task
+        self.leaders += 1
+        task.add_done_callback(lambda done: self._forget(slot, done))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._flights), "leaders": self.leaders, "coalesced": self.coalesced}
@@ -0,0 +1,94 @@
+"""
+Incremental JSON parsing for streamed LLM output.
+Emits top-level fields of a JSON object as soon as each value closes.
+"""
+
+import json
+from typing import Any, List, Optional, Tuple
+
+
+class IncrementalJSONParser:
+    """
+    Parse a top-level JSON object that arrives in arbitrary text chunks.
+
+    Each call to feed() returns the (key, value) pairs whose values closed
+    within that chunk, so callers can forward fields before the object ends.
+    Any text before the opening brace (e.g. a markdown fence) is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._expect_value = False
+        self._key_start: Optional[int] = None
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self.fields = {}
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk and return any newly completed top-level fields."""
+        self.buffer += chunk
+        completed = []
+
+        while self._pos < len(self.buffer) and not self.done:
+            i = self._pos
+            ch = self.buffer[i]
+            self._pos += 1
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and not self._expect_value and self._key_start is not None:
+                        self._key = json.loads(self.buffer[self._key_start:i + 1])
+                        self._key_start = None
+                continue
+
+            if self._depth == 1 and self._expect_value and self._value_start is None and not ch.isspace():
+                self._value_start = i
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and not self._expect_value:
+                    self._key_start = i
+            elif ch == ":" and self._depth == 1:
+                self._expect_value = True
+                self._value_start = None
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._close_field(i, completed)
+                    self.done = True
+            elif ch == "," and self._depth == 1:
+                self._close_field(i, completed)
+
+        return completed
+
+    def _close_field(self, end: int, completed: list):
+        if self._key is not None and self._value_start is not None:
+            try:
+                value = json.loads(self.buffer[self._value_start:end])
+            except json.JSONDecodeError:
+                value = None
+            else:
+                self.fields[self._key] = value
+                completed.append((self._key, value))
+        self._key = None
+        self._value_start = None
+        self._expect_value = False
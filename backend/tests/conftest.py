@@ -0,0 +1,39 @@
+"""
+Shared test setup.
+
+Configuration is read from the environment at import time, so the
+offline settings are applied before any backend module is imported: the
+dependency-free "hashing" embeddings provider, no persistent embedding
+cache, and a throwaway index directory built once per session from the
+bundled medical_knowledge corpus.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.update(
+    OPENROUTER_API_KEY="test-key",
+    EMBEDDINGS_PROVIDER="hashing",
+    EMBEDDING_CACHE_ENABLED="False",
+    TRACING_ENABLED="False",
+    MEDICAL_KNOWLEDGE_PATH=str(BACKEND_DIR / "medical_knowledge"),
+    FAISS_INDEX_DIR=tempfile.mkdtemp(prefix="carenova-test-index-"),
+)
+
+
+@pytest.fixture(scope="session")
+def index_dir() -> str:
+    """Active generation directory of an index built from the bundled corpus."""
+    from config import FAISS_INDEX_DIR
+    from index_store import active_generation_dir
+    from ingest import ingest_documents
+
+    ingest_documents(full_rebuild=True)
+    return active_generation_dir(FAISS_INDEX_DIR)
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController
+from singleflight import SingleFlight
+
+
+async def _leader_and_follower(controller, flight, leader_done):
+    async def slow():
+        await leader_done.wait()
+        return "answer"
+
+    async def request():
+        async with controller.admit():
+            return await flight.run("same query", slow)
+
+    leader = asyncio.ensure_future(request())
+    await asyncio.sleep(0.01)
+    follower = asyncio.ensure_future(request())
+    await asyncio.sleep(0.01)
+    return leader, follower
+
+
+def test_coalesced_follower_does_not_hold_a_slot():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=2, max_queue=0, deadline_seconds=5)
+        leader_done = asyncio.Event()
+        leader, follower = await _leader_and_follower(controller, SingleFlight(), leader_done)
+
+        assert controller.active == 1
+        async with controller.admit():
+            pass
+
+        leader_done.set()
+        assert await asyncio.gather(leader, follower) == ["answer", "answer"]
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_coalesced_follower_stops_waiting_at_its_deadline():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=2, max_queue=0, deadline_seconds=0.1)
+        leader_done = asyncio.Event()
+        leader, follower = await _leader_and_follower(controller, SingleFlight(), leader_done)
+
+        await asyncio.sleep(0.3)
+        assert follower.done() and not leader.done()
+        with pytest.raises(asyncio.TimeoutError):
+            await follower
+        leader_done.set()
+        await leader
+        assert controller.active == 0
+
+    asyncio.run(scenario())
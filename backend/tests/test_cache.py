@@ -0,0 +1,10 @@
+from cache import normalize_query
+
+
+def test_follow_up_answers_keep_their_positions():
+    assert normalize_query("fever | yes | no") != normalize_query("fever | no | yes")
+    assert normalize_query("fever | | yes") != normalize_query("fever | yes |")
+
+
+def test_case_and_whitespace_do_not_change_the_key():
+    assert normalize_query("  Fever and   Cough | YES |no ") == normalize_query("fever and cough | yes | no")
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+import chatbot
+from admission import AdmissionController, remaining_time
+from chatbot import CONFIDENCE_MATCHER, answered_by_triage, calculate_severity, find_red_flags
+
+
+@pytest.mark.parametrize("symptoms", [
+    "no appetite and vomiting blood since morning",
+    "without warning I passed out",
+    "Not sleeping and short of breath",
+    "no energy and chest pain",
+    "no fever but chest pain",
+    "no fever, chest pain since noon",
+])
+def test_negation_cue_does_not_hide_red_flags(symptoms):
+    assert calculate_severity(symptoms) == "Severe"
+    assert answered_by_triage(symptoms)
+
+
+@pytest.mark.parametrize("symptoms", [
+    "no chest pain",
+    "headache but no chest pain",
+    "headache, no chest pain",
+    "denies chest pain or shortness of breath",
+    "I am not confused",
+])
+def test_negated_red_flags_do_not_count(symptoms):
+    assert calculate_severity(symptoms) != "Severe"
+    assert find_red_flags(symptoms) == []
+
+
+def test_negation_covers_only_the_next_phrase():
+    assert CONFIDENCE_MATCHER.find("no fever") == {}
+    assert "cough" in CONFIDENCE_MATCHER.find("no fever and a cough").get("symptom", [])
+
+
+def test_llm_stream_after_triage_holds_an_admission_slot(monkeypatch):
+    controller = AdmissionController(max_concurrency=1, max_queue=0, deadline_seconds=5)
+    seen = []
+
+    async def fake_stream(symptom_text, retrieval=None):
+        seen.append((controller.active, remaining_time() is not None))
+        yield {"type": "result", "data": {}}
+
+    monkeypatch.setattr(chatbot, "TRIAGE_STREAM_FULL_ANALYSIS", True)
+    monkeypatch.setattr(chatbot, "astream_rag_answer", fake_stream)
+
+    async def frames():
+        return [frame["type"] async for frame in chatbot.astream_analyze("chest pain", admit=controller.admit)]
+
+    types = asyncio.run(frames())
+    assert "triage" in types and types[-1] == "analysis"
+    assert seen == [(1, True)]
+    assert controller.active == 0
@@ -0,0 +1,16 @@
+import pickle
+import shutil
+
+import pytest
+
+from index_store import load_generation
+
+
+def test_legacy_pickled_chunks_are_refused(index_dir, tmp_path):
+    legacy = tmp_path / "generation"
+    shutil.copytree(index_dir, legacy)
+    shutil.rmtree(legacy / "chunks")
+    (legacy / "chunks.pkl").write_bytes(pickle.dumps({}))
+
+    with pytest.raises(ValueError, match="ingest.py --full"):
+        load_generation(str(legacy))
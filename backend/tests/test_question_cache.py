@@ -0,0 +1,26 @@
+import question_cache
+import rag
+
+
+def test_index_reload_drops_questions_from_the_previous_index(index_dir, monkeypatch):
+    rag.reload_retriever(force=True)
+    signature = question_cache.symptom_signature("fever and cough")
+    stale = {signature: ["Old question?"]}
+    monkeypatch.setattr(question_cache, "_load_precomputed", lambda: (dict(stale), rag.index_version() - 1))
+    question_cache.cache_questions("fever and cough", ["Runtime question?"])
+    assert question_cache.get_cached_questions("fever and cough") == ["Runtime question?"]
+
+    rag.reload_retriever(force=True)
+
+    assert question_cache.get_cached_questions("fever and cough") is None
+
+
+def test_precomputed_questions_for_the_current_index_are_kept(index_dir, monkeypatch):
+    rag.reload_retriever(force=True)
+    signature = question_cache.symptom_signature("fever and cough")
+    current = {signature: ["Precomputed question?"]}
+    monkeypatch.setattr(question_cache, "_load_precomputed", lambda: (dict(current), rag.index_version()))
+
+    question_cache.reload_precomputed(rag.index_version())
+
+    assert question_cache.get_cached_questions("fever and cough") == ["Precomputed question?"]
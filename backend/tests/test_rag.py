@@ -0,0 +1,80 @@
+import asyncio
+import json
+import shutil
+
+import pytest
+
+import rag
+from chunking import body_system
+from index_store import MANIFEST_FILE
+
+
+def test_index_from_other_embeddings_provider_asks_for_full_rebuild(index_dir, tmp_path):
+    other = tmp_path / "generation"
+    shutil.copytree(index_dir, other)
+    manifest_path = other / MANIFEST_FILE
+    manifest = json.loads(manifest_path.read_text())
+    manifest["embeddings_provider"] = "local"
+    manifest_path.write_text(json.dumps(manifest))
+
+    with pytest.raises(ValueError, match="ingest.py --full"):
+        rag.SimpleRetriever(str(other), embeddings=None)
+
+
+@pytest.fixture
+def loaded_retriever(index_dir):
+    rag.reload_retriever(force=True)
+    return rag.retriever
+
+
+def test_router_is_off_by_default():
+    assert rag.RAG_ROUTER_ENABLED is False
+
+
+def test_routing_boosts_but_does_not_hide_other_body_systems(loaded_retriever, monkeypatch):
+    monkeypatch.setattr(rag, "RAG_ROUTER_ENABLED", True)
+    query = "fever headache"
+    routed = loaded_retriever.router.route(query, rag.RAG_ROUTER_MAX_PARTITIONS, rag.RAG_ROUTER_MIN_SHARE)
+    assert routed and "neurological" not in routed
+
+    context = asyncio.run(rag.aretrieve(query))
+
+    sources = {doc.metadata["source"] for doc, _ in context.hits}
+    assert "neurological/migraine.md" in sources
+    assert {body_system(source) for source in sources} - set(routed)
+
+
+def test_hybrid_hits_carry_cosine_scores_and_fused_rank(loaded_retriever, monkeypatch):
+    assert rag.RAG_HYBRID_ENABLED
+    # Hashing embeddings score lower than a real model
+    monkeypatch.setattr(rag, "RAG_SCORE_THRESHOLD", 0.1)
+    query = "fever cough sore throat"
+    query_emb = loaded_retriever.embed(query)
+    cosine = dict(loaded_retriever._cosine_search(query_emb, loaded_retriever.index.ntotal))
+
+    hits = loaded_retriever.search(query_emb, loaded_retriever.keyword_search(query))
+
+    assert hits
+    for rank, (doc, score) in enumerate(hits, start=1):
+        assert score == pytest.approx(cosine[doc.metadata["chunk_id"]], abs=1e-5)
+        assert doc.metadata["score"] == pytest.approx(score, abs=1e-4)
+        assert doc.metadata["fused_rank"] == rank
+
+
+def test_score_threshold_applies_to_keyword_hits_under_hybrid_fusion(loaded_retriever, monkeypatch):
+    assert rag.RAG_HYBRID_ENABLED
+    monkeypatch.setattr(rag, "RAG_K_RESULTS", 100)
+    query = "fever cough sore throat"
+    query_emb = loaded_retriever.embed(query)
+    cosine = dict(loaded_retriever._cosine_search(query_emb, loaded_retriever.index.ntotal))
+    keyword_hits = loaded_retriever.keyword_search(query)
+    weak = keyword_hits[0][0]  # BM25's best match; its cosine sets the threshold below
+
+    def fused_ids(threshold):
+        monkeypatch.setattr(rag, "RAG_SCORE_THRESHOLD", threshold)
+        hits = loaded_retriever.search(query_emb, keyword_hits)
+        assert all(score >= threshold for _, score in hits)
+        return {doc.metadata["chunk_id"] for doc, _ in hits}
+
+    assert weak in fused_ids(cosine[weak] - 1e-3)
+    assert weak not in fused_ids(cosine[weak] + 1e-3)
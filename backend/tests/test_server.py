@@ -0,0 +1,22 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+
+@pytest.fixture
+def client():
+    return TestClient(server.app)
+
+
+def test_admin_endpoints_are_closed_without_a_configured_key(client, monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_API_KEY", None)
+    assert client.get("/admin/index").status_code == 503
+    assert client.post("/admin/reload-index").status_code == 503
+
+
+def test_admin_endpoints_check_the_key(client, monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_API_KEY", "s3cret")
+    assert client.get("/admin/index").status_code == 401
+    assert client.get("/admin/index", headers={"X-Admin-Key": "wrong"}).status_code == 401
+    assert client.get("/admin/index", headers={"X-Admin-Key": "s3cret"}).status_code == 200
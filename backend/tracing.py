@@ -0,0 +1,245 @@
+"""
+Per-request tracing spans exported as JSON lines.
+
+Every HTTP request (and WebSocket chat) opens a root span carrying a
+request id; code below it opens child spans with span() or @traced, and
+the pipeline stages timed by metrics.timed() become spans too, giving a
+tree like
+
+    POST /analyze → analyze → score → rag_answer → embed → search → prompt → llm → parse
+
+The current span lives in a context variable, so the tree follows the
+request across awaits, spawned tasks and asyncio.to_thread workers.
+
+Finished spans go through a bounded queue to one background writer that
+appends them to TRACE_FILE, one JSON object per line, with OpenTelemetry
+field names (trace_id, span_id, parent_span_id, start/end_time_unix_nano,
+attributes, status) so a collector's file receiver or a script can ingest
+them. Spans are dropped and counted when the queue is full. Symptom text
+is never recorded, only sizes and outcomes.
+"""
+
+import atexit
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from config import TRACE_FILE, TRACE_MAX_BYTES, TRACE_QUEUE_SIZE, TRACE_SAMPLE_RATE, TRACING_ENABLED
+
+SERVICE_NAME = "carenova-api"
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_span_id", "name", "kind", "request_id",
+                 "start_ns", "attributes", "status", "status_message")
+
+    def __init__(self, name: str, parent: Optional["Span"], kind: str, request_id: Optional[str],
+                 attributes: Dict[str, Any]):
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_span_id = parent.span_id if parent else None
+        self.name = name
+        self.kind = kind
+        self.request_id = request_id if request_id is not None else (parent.request_id if parent else None)
+        self.start_ns = time.time_ns()
+        self.attributes = attributes
+        self.status = "OK"
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def update_name(self, name: str):
+        self.name = name
+
+    def to_dict(self, end_ns: int) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "request_id": self.request_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": end_ns,
+            "duration_ms": round((end_ns - self.start_ns) / 1e6, 3),
+            "status": {"code": self.status, "message": self.status_message},
+            "attributes": self.attributes,
+            "resource": {"service.name": SERVICE_NAME},
+        }
+
+
+class _NoopSpan:
+    """Stands in for spans that are not recorded (tracing off or trace not sampled)."""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def update_name(self, name: str):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current: ContextVar[Any] = ContextVar("current_span", default=None)
+
+
+class _Exporter:
+    """Single background writer appending finished spans to the trace file."""
+
+    def __init__(self, path: str, max_bytes: int, queue_size: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+
+    def submit(self, record: dict):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name="carenova-trace-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, batch):
+        try:
+            if self.max_bytes > 0 and self.path.exists() and self.path.stat().st_size > self.max_bytes:
+                os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(record, default=str) + "\n" for record in batch))
+            self.exported += len(batch)
+        except OSError:
+            self.dropped += len(batch)
+
+    def flush(self):
+        """Block until every queued span is written."""
+        if self._thread is not None:
+            self._queue.join()
+
+
+_exporter = _Exporter(TRACE_FILE, TRACE_MAX_BYTES, TRACE_QUEUE_SIZE)
+
+
+@contextmanager
+def span(name: str, kind: str = "INTERNAL", request_id: Optional[str] = None, **attributes):
+    """
+    Open a span as a child of the current one (or a new trace's root).
+
+    Roots are sampled at TRACE_SAMPLE_RATE; spans under an unsampled root
+    are not recorded. Exceptions mark the span ERROR and propagate.
+    """
+    parent = _current.get()
+    if not TRACING_ENABLED or parent is _NOOP_SPAN or (parent is None and random.random() >= TRACE_SAMPLE_RATE):
+        token = _current.set(_NOOP_SPAN)
+        try:
+            yield _NOOP_SPAN
+        finally:
+            _reset(token)
+        return
+
+    current = Span(name, parent, kind, request_id, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "ERROR"
+        current.status_message = f"{type(e).__name__}: {e}"[:200]
+        raise
+    finally:
+        _reset(token)
+        _exporter.submit(current.to_dict(time.time_ns()))
+
+
+def _reset(token):
+    try:
+        _current.reset(token)
+    except ValueError:
+        # An async generator closed from another context (e.g. by the garbage collector)
+        pass
+
+
+def traced(name: str):
+    """Decorator running a function, coroutine function or async generator inside a span."""
+    def decorate(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def gen_wrapper(*args, **kwargs):
+                with span(name):
+                    async for item in fn(*args, **kwargs):
+                        yield item
+            return gen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def current_span():
+    """The active span (a no-op stand-in when none is recorded), to attach attributes to."""
+    current = _current.get()
+    return current if current is not None else _NOOP_SPAN
+
+
+def current_ids() -> Optional[Tuple[str, str, Optional[str]]]:
+    """(trace_id, span_id, request_id) of the active recorded span, for log correlation."""
+    current = _current.get()
+    if current is None or current is _NOOP_SPAN:
+        return None
+    return current.trace_id, current.span_id, current.request_id
+
+
+def get_trace_stats() -> Dict[str, Any]:
+    return {
+        "enabled": TRACING_ENABLED,
+        "file": str(_exporter.path),
+        "sample_rate": TRACE_SAMPLE_RATE,
+        "exported": _exporter.exported,
+        "dropped": _exporter.dropped,
+        "queued": _exporter._queue.qsize(),
+    }
+
+
+def flush():
+    """Wait for queued spans to reach the trace file (tests, CLI shutdown)."""
+    _exporter.flush()
@@ -0,0 +1,68 @@
+"""
+Deterministic triage fast path for red-flag symptoms.
+
+When the keyword scorer finds a Severe red flag ("unconscious", "vomiting
+blood", ...), waiting seconds on embedding and the LLM is the wrong
+trade-off. emergency_response() answers from a curated template plus the
+best-matching Emergency Signs / When to See a Doctor sections, looked up
+with BM25 alone, so it returns in milliseconds.
+"""
+
+import time
+from typing import Dict, List
+
+from logger import get_logger
+from rag import lookup_sections
+from config import TRIAGE_MAX_WARNING_SIGNS
+
+logger = get_logger(__name__)
+
+EMERGENCY_SECTIONS = ["emergency_signs", "when_to_see_a_doctor"]
+
+EMERGENCY_TEMPLATE = {
+    "possible_conditions": ["Possible medical emergency"],
+    "home_care_tips": [
+        "Call your local emergency number or go to the nearest emergency department now",
+        "Do not drive yourself; ask someone to take you or wait for an ambulance",
+        "Stay with another person until help arrives",
+        "Do not eat, drink or take new medication unless a medical professional tells you to",
+    ],
+    "when_to_see_doctor": ["Now — these symptoms need immediate medical attention."],
+    "disclaimer": "This is an automated safety alert, not a medical diagnosis. Seek emergency care immediately.",
+}
+
+
+def _warning_signs(symptom_text: str) -> List[str]:
+    """Bullet points from the emergency sections that best match the symptoms."""
+    signs = []
+    for doc in lookup_sections(symptom_text, EMERGENCY_SECTIONS, k=3):
+        disease = doc.metadata.get("disease", "")
+        for line in doc.page_content.splitlines():
+            if line.startswith(("- ", "* ")):
+                sign = line[2:].strip()
+                signs.append(f"{disease}: {sign}" if disease else sign)
+    return list(dict.fromkeys(signs))[:TRIAGE_MAX_WARNING_SIGNS]
+
+
+def emergency_response(symptom_text: str, red_flags: List[str]) -> Dict:
+    """Immediate emergency guidance in the RAG answer shape; no embedding or LLM call."""
+    started = time.perf_counter()
+    try:
+        warning_signs = _warning_signs(symptom_text)
+    except Exception as e:
+        logger.warning(f"⚠️  Emergency section lookup failed: {e}")
+        warning_signs = []
+
+    response = {
+        **EMERGENCY_TEMPLATE,
+        "explanation": [
+            f"You reported {flag}, which can be a sign of a serious condition that needs urgent assessment."
+            for flag in red_flags
+        ],
+        "when_to_see_doctor": EMERGENCY_TEMPLATE["when_to_see_doctor"] + warning_signs,
+    }
+    logger.info(
+        f"🚨 Triage fast path: {', '.join(red_flags)} "
+        f"({(time.perf_counter() - started) * 1000:.1f} ms)"
+    )
+    return response